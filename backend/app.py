@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 import os
 import base64
@@ -7,10 +7,17 @@ from PIL import Image
 import google.generativeai as genai
 from dotenv import load_dotenv
 import json
-import sqlite3
+import hmac
 from datetime import datetime, date
+import threading
+import time
 import tempfile
 import random
+from shards import ShardPool, InvalidUserId
+from cold_storage import ensure_cold_storage, put_cold_text, get_cold_text, preview_text, PREVIEW_CHARS
+import synthetic_data
+from embeddings import EmbeddingIndexes, INDEXED_KINDS
+import macro_parsing
 
 # Load environment variables
 load_dotenv()
@@ -21,10 +28,105 @@ CORS(app)  # Enable CORS for all routes
 
 # Configure Gemini API
 genai.configure(api_key=os.getenv('GEMINI_API_KEY'))
+GEMINI_MODEL = 'gemini-1.5-flash'
+
+# Prompts shared by the Flask handlers and the async handlers in asgi.py
+MEDICAL_RECORD_OCR_PROMPT = """
+        Please extract all text from this medical record image. 
+        Organize the information clearly and maintain the structure of the document.
+        Include all patient information, diagnoses, treatments, medications, dates, and any other relevant medical information.
+        """
+
+SUMMARY_PROMPT = "Please provide a concise medical summary of the following medical record text. Focus on key diagnoses, treatments, medications, and important medical information:\n\n{text}"
+
+PRESCRIPTION_EXTRACTION_PROMPT = """
+        Please analyze this prescription image and extract the following information:
+        1. Patient name (if visible)
+        2. Doctor name and clinic/hospital
+        3. Date of prescription
+        4. List of all prescribed medicines with their:
+           - Generic name and brand name (if available)
+           - Dosage (strength)
+           - Frequency (how often to take)
+           - Duration (how long to take)
+           - Special instructions
+        
+        Format the response as a structured JSON with the following format:
+        {
+            "patient_name": "...",
+            "doctor_name": "...",
+            "clinic": "...",
+            "date": "...",
+            "medicines": [
+                {
+                    "name": "...",
+                    "generic_name": "...",
+                    "dosage": "...",
+                    "frequency": "...",
+                    "duration": "...",
+                    "instructions": "..."
+                }
+            ]
+        }
+        """
+
+PRESCRIPTION_ANALYSIS_PROMPT = """
+        Based on the following prescription information, please provide a detailed explanation for each medicine:
+        
+        {extracted_info}
+        
+        For each medicine, explain:
+        1. What condition or symptom it treats
+        2. How it works in the body
+        3. Why the doctor might have prescribed it
+        4. Important things the patient should know
+        
+        Provide the response in a clear, patient-friendly format that helps them understand their treatment.
+        """
+
+TRANSCRIPTION_PROMPT = """
+            Please transcribe this audio recording accurately. The person is describing what they ate during the day.
+            Only return the transcribed text, nothing else.
+            """
+
+# Per-user database shards
+DATA_DIR = os.getenv('HEALTHVAULT_DATA_DIR', 'data')
+SHARD_CACHE_SIZE = int(os.getenv('SHARD_CACHE_SIZE', '64'))
+LEGACY_DB_PATH = 'medical_records.db'
+
+# Header carrying the authenticated user id, set by the auth proxy
+USER_ID_HEADER = 'X-User-Id'
+DEFAULT_USER_ID = 'default'
+
+# Secret the auth proxy sends with every request, proving the user id
+# header came from the proxy and not from the client
+AUTH_PROXY_SECRET = os.getenv('AUTH_PROXY_SECRET', '')
+AUTH_SECRET_HEADER = 'X-Auth-Proxy-Secret'
+
+# Serve every request from the default user's shard (local single-user
+# installs); otherwise requests without a verified identity are rejected
+SINGLE_USER_MODE = os.getenv('HEALTHVAULT_SINGLE_USER', '').lower() in ('1', 'true', 'yes')
+
+# Dashboard payload sizes and how long a cached payload may be served
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', '20'))
+DASHBOARD_MAX_PAGE_SIZE = 100
+DASHBOARD_STATS_DAYS = 14
+DASHBOARD_CACHE_TTL = float(os.getenv('DASHBOARD_CACHE_TTL', '5'))
+
+# Related-record and semantic search result counts
+DEFAULT_RELATED_LIMIT = 5
+MAX_SEARCH_LIMIT = 50
+
+# Upper bound on rows a single synthetic data request may create
+MAX_SYNTHETIC_ROWS = int(os.getenv('MAX_SYNTHETIC_ROWS', '1000000'))
+
+# The synthetic data endpoint is off unless enabled, and even then only
+# writes into dedicated synthetic-* users, never a real user's records
+ENABLE_SYNTHETIC_DATA = os.getenv('ENABLE_SYNTHETIC_DATA', '').lower() in ('1', 'true', 'yes')
 
 # Initialize database
-def init_db():
-    conn = sqlite3.connect('medical_records.db')
+def init_db(conn):
+    """Create the schema in a freshly opened user shard"""
     cursor = conn.cursor()
     
     # Create medical records table
@@ -32,8 +134,8 @@ def init_db():
         CREATE TABLE IF NOT EXISTS medical_records (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             filename TEXT NOT NULL,
-            original_text TEXT,
             summary TEXT,
+            source TEXT DEFAULT 'upload',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
@@ -43,12 +145,19 @@ def init_db():
         CREATE TABLE IF NOT EXISTS prescriptions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             filename TEXT NOT NULL,
+            medicines_preview TEXT,
             medicines TEXT,
-            analysis TEXT,
+            source TEXT DEFAULT 'upload',
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
     
+    # Shards created before rows were tagged with where they came from
+    for table in ('medical_records', 'prescriptions'):
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'source' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN source TEXT DEFAULT 'upload'")
+    
     # Create macro entries table
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS macro_entries (
@@ -80,20 +189,75 @@ def init_db():
     ''')
     
     conn.commit()
-    conn.close()
+    
+    # Large OCR text and analyses live compressed in side tables
+    ensure_cold_storage(conn)
+
+shard_pool = ShardPool(DATA_DIR, capacity=SHARD_CACHE_SIZE, initializer=init_db)
+
+def migrate_legacy_db():
+    """Move a pre-sharding single-user database into the default user's shard"""
+    default_path = shard_pool.shard_path(DEFAULT_USER_ID)
+    if os.path.exists(LEGACY_DB_PATH) and not os.path.exists(default_path):
+        os.replace(LEGACY_DB_PATH, default_path)
+
+# Adopt any existing single-user database on startup
+migrate_legacy_db()
 
-# Initialize database on startup
-init_db()
+# Per-user vector indexes for related records and semantic search, stored next to the shards
+embedding_indexes = EmbeddingIndexes(DATA_DIR, capacity=SHARD_CACHE_SIZE)
+
+def authenticate_request(headers):
+    """Return (user_id, None) for a verified caller, or (None, (error, status)).
+
+    ``headers`` is any mapping whose get() accepts lower-case header names.
+    """
+    if SINGLE_USER_MODE:
+        return DEFAULT_USER_ID, None
+
+    secret = headers.get(AUTH_SECRET_HEADER.lower()) or ''
+    if not AUTH_PROXY_SECRET or not hmac.compare_digest(secret.encode(), AUTH_PROXY_SECRET.encode()):
+        return None, ('Authentication required', 401)
+
+    user_id = headers.get(USER_ID_HEADER.lower())
+    if not user_id:
+        return None, ('Authentication required', 401)
+    try:
+        shard_pool.shard_path(user_id)
+    except InvalidUserId as e:
+        return None, (str(e), 400)
+    return user_id, None
+
+def get_db():
+    """Open a transaction on the current user's shard"""
+    return shard_pool.connection(g.user_id)
+
+@app.before_request
+def resolve_user_shard():
+    """Route the request to the authenticated user's shard"""
+    # CORS preflights carry no credentials; flask-cors answers them
+    if request.method == 'OPTIONS':
+        return None
+    g.user_id, error = authenticate_request(request.headers)
+    if error:
+        message, status = error
+        return jsonify({'error': message}), status
+
+def decode_image(image_data):
+    """Convert a base64 data URL to a fully decoded PIL Image"""
+    image_bytes = base64.b64decode(image_data.split(',')[1])
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    return image
 
 def process_image_with_gemini(image_data, prompt):
     """Process image using Gemini model"""
     try:
         # Convert base64 to PIL Image
-        image_bytes = base64.b64decode(image_data.split(',')[1])
-        image = Image.open(io.BytesIO(image_bytes))
+        image = decode_image(image_data)
         
         # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = genai.GenerativeModel(GEMINI_MODEL)
         
         # Generate response
         response = model.generate_content([prompt, image])
@@ -104,38 +268,36 @@ def process_image_with_gemini(image_data, prompt):
 def generate_summary(text):
     """Generate summary using Gemini model"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"Please provide a concise medical summary of the following medical record text. Focus on key diagnoses, treatments, medications, and important medical information:\n\n{text}"
-        response = model.generate_content(prompt)
+        model = genai.GenerativeModel(GEMINI_MODEL)
+        response = model.generate_content(SUMMARY_PROMPT.format(text=text))
         return response.text
     except Exception as e:
         return f"Error generating summary: {str(e)}"
 
+def upload_audio(audio_data):
+    """Upload base64 audio to Gemini and return the file handle"""
+    # Save audio data to temporary file
+    audio_bytes = base64.b64decode(audio_data.split(',')[1])
+    
+    with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_file:
+        temp_file.write(audio_bytes)
+        temp_file_path = temp_file.name
+    
+    try:
+        return genai.upload_file(temp_file_path)
+    finally:
+        # Clean up temporary file
+        os.unlink(temp_file_path)
+
 def process_audio_with_gemini(audio_data):
     """Process audio using Gemini model for speech-to-text"""
     try:
-        # Save audio data to temporary file
-        audio_bytes = base64.b64decode(audio_data.split(',')[1])
+        # Use Gemini for speech-to-text
+        audio_file = upload_audio(audio_data)
+        model = genai.GenerativeModel(GEMINI_MODEL)
         
-        with tempfile.NamedTemporaryFile(suffix='.webm', delete=False) as temp_file:
-            temp_file.write(audio_bytes)
-            temp_file_path = temp_file.name
-        
-        try:
-            # Use Gemini for speech-to-text
-            audio_file = genai.upload_file(temp_file_path)
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            
-            prompt = """
-            Please transcribe this audio recording accurately. The person is describing what they ate during the day.
-            Only return the transcribed text, nothing else.
-            """
-            
-            response = model.generate_content([prompt, audio_file])
-            return response.text
-        finally:
-            # Clean up temporary file
-            os.unlink(temp_file_path)
+        response = model.generate_content([TRANSCRIPTION_PROMPT, audio_file])
+        return response.text
             
     except Exception as e:
         return f"Error processing audio: {str(e)}"
@@ -143,107 +305,264 @@ def process_audio_with_gemini(audio_data):
 def parse_food_and_calculate_macros(transcribed_text):
     """Parse food items from text and calculate macros using Gemini"""
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""
-        Analyze the following food diary entry and extract detailed nutritional information:
-
-        "{transcribed_text}"
-
-        Please provide a JSON response with the following structure:
-        {{
-            "foods": [
-                {{
-                    "name": "food name",
-                    "quantity": "estimated quantity/serving size",
-                    "calories": estimated_calories_per_serving,
-                    "protein": estimated_protein_grams,
-                    "carbs": estimated_carbs_grams,
-                    "fat": estimated_fat_grams
-                }}
-            ],
-            "total_calories": sum_of_all_calories,
-            "total_protein": sum_of_all_protein,
-            "total_carbs": sum_of_all_carbs,
-            "total_fat": sum_of_all_fat,
-            "analysis": "brief explanation of the nutritional breakdown"
-        }}
-
-        Important notes:
-        - Make reasonable estimates for quantities if not specified
-        - Use standard serving sizes and nutritional databases
-        - Be as accurate as possible with macro calculations
-        - If unsure about a food item, make a reasonable estimate
-        - Return only valid JSON, no additional text
-        """
-        
-        response = model.generate_content(prompt)
-        
-        # Try to parse JSON response
-        try:
-            return json.loads(response.text)
-        except json.JSONDecodeError:
-            # If JSON parsing fails, extract JSON from the response
-            import re
-            json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group())
-            else:
-                raise ValueError("Could not extract valid JSON from response")
+        model = genai.GenerativeModel(GEMINI_MODEL, generation_config=macro_parsing.JSON_OUTPUT_CONFIG)
+        return macro_parsing.parse_macros(
+            transcribed_text, lambda prompt: model.generate_content(prompt).text)
                 
     except Exception as e:
-        return {
-            "error": f"Error parsing food data: {str(e)}",
-            "foods": [],
-            "total_calories": 0,
-            "total_protein": 0,
-            "total_carbs": 0,
-            "total_fat": 0,
-            "analysis": "Failed to analyze food data"
-        }
+        return macro_parsing.failure_result(e)
+
+def sync_embedding_index(conn, user_id):
+    """Bring a user's embedding index up to date and return it"""
+    index = embedding_indexes.get(user_id)
+    with index.lock:
+        index.sync(conn.cursor())
+    return index
 
-def update_daily_macro_stats(entry_date, calories, protein, carbs, fat):
+def update_embedding_index(user_id):
+    """Index newly inserted rows for a user"""
+    try:
+        with shard_pool.connection(user_id) as conn:
+            sync_embedding_index(conn, user_id)
+    except Exception as e:
+        print(f"Error updating embedding index: {str(e)}")
+
+def load_search_results(cursor, matches):
+    """Attach list fields to (kind, id, score) matches, keeping their order"""
+    rows = {}
+    for kind, (_, table, column) in INDEXED_KINDS.items():
+        ids = [row_id for match_kind, row_id, _ in matches if match_kind == kind]
+        if not ids:
+            continue
+        cursor.execute(f'''
+            SELECT id, filename, {column}, created_at
+            FROM {table}
+            WHERE id IN ({','.join('?' * len(ids))})
+        ''', ids)
+        for row in cursor.fetchall():
+            rows[(kind, row[0])] = {
+                'type': kind,
+                'id': row[0],
+                'filename': row[1],
+                column: row[2],
+                'created_at': row[3]
+            }
+    return [dict(rows[(kind, row_id)], score=round(score, 4))
+            for kind, row_id, score in matches if (kind, row_id) in rows]
+
+def update_daily_macro_stats(user_id, entry_date, calories, protein, carbs, fat):
     """Update or insert daily macro statistics"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        
-        # Check if entry exists for today
-        cursor.execute('''
-            SELECT id, total_calories, total_protein, total_carbs, total_fat, meal_count
-            FROM daily_macro_stats 
-            WHERE entry_date = ?
-        ''', (entry_date,))
-        
-        existing = cursor.fetchone()
-        
-        if existing:
-            # Update existing entry
-            new_calories = existing[1] + calories
-            new_protein = existing[2] + protein
-            new_carbs = existing[3] + carbs
-            new_fat = existing[4] + fat
-            new_meal_count = existing[5] + 1
+        with shard_pool.connection(user_id) as conn:
+            cursor = conn.cursor()
             
+            # Check if entry exists for today
             cursor.execute('''
-                UPDATE daily_macro_stats 
-                SET total_calories = ?, total_protein = ?, total_carbs = ?, 
-                    total_fat = ?, meal_count = ?, updated_at = CURRENT_TIMESTAMP
+                SELECT id, total_calories, total_protein, total_carbs, total_fat, meal_count
+                FROM daily_macro_stats 
                 WHERE entry_date = ?
-            ''', (new_calories, new_protein, new_carbs, new_fat, new_meal_count, entry_date))
-        else:
-            # Insert new entry
-            cursor.execute('''
-                INSERT INTO daily_macro_stats 
-                (entry_date, total_calories, total_protein, total_carbs, total_fat, meal_count)
-                VALUES (?, ?, ?, ?, ?, 1)
-            ''', (entry_date, calories, protein, carbs, fat))
-        
-        conn.commit()
-        conn.close()
+            ''', (entry_date,))
+            
+            existing = cursor.fetchone()
+            
+            if existing:
+                # Update existing entry
+                new_calories = existing[1] + calories
+                new_protein = existing[2] + protein
+                new_carbs = existing[3] + carbs
+                new_fat = existing[4] + fat
+                new_meal_count = existing[5] + 1
+                
+                cursor.execute('''
+                    UPDATE daily_macro_stats 
+                    SET total_calories = ?, total_protein = ?, total_carbs = ?, 
+                        total_fat = ?, meal_count = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE entry_date = ?
+                ''', (new_calories, new_protein, new_carbs, new_fat, new_meal_count, entry_date))
+            else:
+                # Insert new entry
+                cursor.execute('''
+                    INSERT INTO daily_macro_stats 
+                    (entry_date, total_calories, total_protein, total_carbs, total_fat, meal_count)
+                    VALUES (?, ?, ?, ?, ?, 1)
+                ''', (entry_date, calories, protein, carbs, fat))
         
     except Exception as e:
         print(f"Error updating daily stats: {str(e)}")
 
+def save_medical_record(user_id, filename, extracted_text, summary):
+    """Store a processed medical record and return its id"""
+    with shard_pool.connection(user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO medical_records (filename, summary)
+            VALUES (?, ?)
+        ''', (filename, summary))
+        record_id = cursor.lastrowid
+        put_cold_text(cursor, 'medical_record_texts', record_id, extracted_text)
+    
+    update_embedding_index(user_id)
+    return record_id
+
+def save_prescription(user_id, filename, extracted_info, medicine_analysis):
+    """Store an analyzed prescription and return its id"""
+    with shard_pool.connection(user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO prescriptions (filename, medicines_preview, medicines)
+            VALUES (?, ?, ?)
+        ''', (filename, preview_text(extracted_info), extracted_info))
+        prescription_id = cursor.lastrowid
+        put_cold_text(cursor, 'prescription_analyses', prescription_id, medicine_analysis)
+    
+    update_embedding_index(user_id)
+    return prescription_id
+
+def save_macro_entry(user_id, transcribed_text, macro_data):
+    """Store a voice macro entry, update today's stats and return (id, entry_date)"""
+    entry_date = date.today().isoformat()
+    
+    with shard_pool.connection(user_id) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO macro_entries 
+            (user_input, transcribed_text, parsed_foods, total_calories, 
+             total_protein, total_carbs, total_fat, entry_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', ('voice_input', transcribed_text, json.dumps(macro_data['foods']),
+              macro_data['total_calories'], macro_data['total_protein'],
+              macro_data['total_carbs'], macro_data['total_fat'], entry_date))
+        
+        entry_id = cursor.lastrowid
+    
+    update_daily_macro_stats(
+        user_id,
+        entry_date,
+        macro_data['total_calories'],
+        macro_data['total_protein'],
+        macro_data['total_carbs'],
+        macro_data['total_fat']
+    )
+    return entry_id, entry_date
+
+def get_page_args():
+    """Read optional limit/offset pagination arguments (no limit by default)"""
+    limit = request.args.get('limit', -1, type=int)
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    return limit, offset
+
+def list_medical_records(cursor, limit=-1, offset=0):
+    """Medical record list rows, newest first, with a preview of the summary"""
+    cursor.execute('''
+        SELECT id, filename, substr(summary, 1, ?), created_at
+        FROM medical_records
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''', (PREVIEW_CHARS, limit, offset))
+    return [{
+        'id': record[0],
+        'filename': record[1],
+        'summary': record[2],
+        'created_at': record[3]
+    } for record in cursor.fetchall()]
+
+def list_prescriptions(cursor, limit=-1, offset=0):
+    """Prescription list rows, newest first, with a preview of the medicines"""
+    cursor.execute('''
+        SELECT id, filename, medicines_preview, created_at
+        FROM prescriptions
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''', (limit, offset))
+    return [{
+        'id': prescription[0],
+        'filename': prescription[1],
+        'medicines': prescription[2],
+        'created_at': prescription[3]
+    } for prescription in cursor.fetchall()]
+
+def list_macro_entries(cursor, limit=-1, offset=0):
+    """Macro entry list rows, newest first"""
+    cursor.execute('''
+        SELECT id, transcribed_text, total_calories, total_protein, 
+               total_carbs, total_fat, entry_date, created_at
+        FROM macro_entries
+        ORDER BY created_at DESC, id DESC
+        LIMIT ? OFFSET ?
+    ''', (limit, offset))
+    return [{
+        'id': entry[0],
+        'transcribed_text': entry[1],
+        'total_calories': entry[2],
+        'total_protein': entry[3],
+        'total_carbs': entry[4],
+        'total_fat': entry[5],
+        'entry_date': entry[6],
+        'created_at': entry[7]
+    } for entry in cursor.fetchall()]
+
+def list_daily_macro_stats(cursor, days):
+    """The most recent ``days`` daily macro stats rows, newest first"""
+    cursor.execute('''
+        SELECT entry_date, total_calories, total_protein, total_carbs, 
+               total_fat, meal_count, updated_at
+        FROM daily_macro_stats
+        ORDER BY entry_date DESC
+        LIMIT ?
+    ''', (days,))
+    return [{
+        'entry_date': stat[0],
+        'total_calories': stat[1],
+        'total_protein': stat[2],
+        'total_carbs': stat[3],
+        'total_fat': stat[4],
+        'meal_count': stat[5],
+        'updated_at': stat[6]
+    } for stat in cursor.fetchall()]
+
+# Per-user dashboard payloads: user_id -> (shard version, expiry, payload)
+_dashboard_cache = {}
+_dashboard_cache_lock = threading.Lock()
+
+def build_dashboard(conn, page_size):
+    """Collect every list the app needs on first paint from one read snapshot"""
+    cursor = conn.cursor()
+    # An explicit transaction makes all queries see the same snapshot
+    cursor.execute('BEGIN')
+    daily_stats = list_daily_macro_stats(cursor, DASHBOARD_STATS_DAYS)
+    today = date.today().isoformat()
+    return {
+        'medical_records': list_medical_records(cursor, page_size),
+        'prescriptions': list_prescriptions(cursor, page_size),
+        'macro_entries': list_macro_entries(cursor, page_size),
+        'daily_stats': daily_stats,
+        'today_stats': next((stat for stat in daily_stats if stat['entry_date'] == today), None),
+        'page_size': page_size
+    }
+
+def get_dashboard_payload(user_id, page_size):
+    """Serve the dashboard from cache until it expires or the shard is written to"""
+    version = shard_pool.version(user_id)
+    now = time.monotonic()
+    key = (user_id, page_size)
+    
+    with _dashboard_cache_lock:
+        cached = _dashboard_cache.get(key)
+    if cached and cached[0] == version and cached[1] > now:
+        return cached[2]
+    
+    with shard_pool.connection(user_id) as conn:
+        # Read the version under the shard lock so it matches the snapshot
+        version = shard_pool.version(user_id)
+        payload = build_dashboard(conn, page_size)
+    
+    with _dashboard_cache_lock:
+        # Drop expired payloads so idle users do not accumulate
+        for stale_key in [k for k, v in _dashboard_cache.items() if v[1] <= now]:
+            del _dashboard_cache[stale_key]
+        _dashboard_cache[key] = (version, now + DASHBOARD_CACHE_TTL, payload)
+    return payload
+
 @app.route('/api/upload-medical-record', methods=['POST'])
 def upload_medical_record():
     """Upload and process medical record image"""
@@ -256,27 +575,13 @@ def upload_medical_record():
             return jsonify({'error': 'No image data provided'}), 400
         
         # Process image with Gemini
-        ocr_prompt = """
-        Please extract all text from this medical record image. 
-        Organize the information clearly and maintain the structure of the document.
-        Include all patient information, diagnoses, treatments, medications, dates, and any other relevant medical information.
-        """
-        
-        extracted_text = process_image_with_gemini(image_data, ocr_prompt)
+        extracted_text = process_image_with_gemini(image_data, MEDICAL_RECORD_OCR_PROMPT)
         
         # Generate summary
         summary = generate_summary(extracted_text)
         
         # Save to database
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO medical_records (filename, original_text, summary)
-            VALUES (?, ?, ?)
-        ''', (filename, extracted_text, summary))
-        record_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        record_id = save_medical_record(g.user_id, filename, extracted_text, summary)
         
         return jsonify({
             'id': record_id,
@@ -291,24 +596,13 @@ def upload_medical_record():
 
 @app.route('/api/medical-records', methods=['GET'])
 def get_medical_records():
-    """Get all medical records"""
+    """Get medical records, newest first, optionally paginated"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, filename, summary, created_at
-            FROM medical_records
-            ORDER BY created_at DESC
-        ''')
-        records = cursor.fetchall()
-        conn.close()
-        
-        return jsonify([{
-            'id': record[0],
-            'filename': record[1],
-            'summary': record[2],
-            'created_at': record[3]
-        } for record in records])
+        limit, offset = get_page_args()
+        with get_db() as conn:
+            records = list_medical_records(conn.cursor(), limit, offset)
+        
+        return jsonify(records)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -317,15 +611,15 @@ def get_medical_records():
 def get_medical_record(record_id):
     """Get specific medical record"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, filename, original_text, summary, created_at
-            FROM medical_records
-            WHERE id = ?
-        ''', (record_id,))
-        record = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, filename, summary, created_at
+                FROM medical_records
+                WHERE id = ?
+            ''', (record_id,))
+            record = cursor.fetchone()
+            original_text = get_cold_text(cursor, 'medical_record_texts', record_id) if record else None
         
         if not record:
             return jsonify({'error': 'Record not found'}), 404
@@ -333,14 +627,61 @@ def get_medical_record(record_id):
         return jsonify({
             'id': record[0],
             'filename': record[1],
-            'original_text': record[2],
-            'summary': record[3],
-            'created_at': record[4]
+            'original_text': original_text,
+            'summary': record[2],
+            'created_at': record[3]
         })
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/medical-record/<int:record_id>/related', methods=['GET'])
+def get_related_records(record_id):
+    """Get the records and prescriptions most similar to a medical record"""
+    try:
+        limit = min(request.args.get('limit', DEFAULT_RELATED_LIMIT, type=int), MAX_SEARCH_LIMIT)
+        
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT summary FROM medical_records WHERE id = ?', (record_id,))
+            record = cursor.fetchone()
+            if not record:
+                return jsonify({'error': 'Record not found'}), 404
+            
+            index = sync_embedding_index(conn, g.user_id)
+            with index.lock:
+                vector = index.vector_for('medical_record', record_id)
+                if vector is None:
+                    vector = index.embedder.embed([record[0]])[0]
+                matches = index.search(vector, limit, exclude=('medical_record', record_id))
+            related = load_search_results(cursor, matches)
+        
+        return jsonify({'id': record_id, 'related': related})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/semantic-search', methods=['GET'])
+def semantic_search():
+    """Search record summaries and prescription medicines by similarity"""
+    try:
+        query = request.args.get('q', '').strip()
+        limit = min(request.args.get('limit', 10, type=int), MAX_SEARCH_LIMIT)
+        
+        if not query:
+            return jsonify({'error': 'No search query provided'}), 400
+        
+        with get_db() as conn:
+            index = sync_embedding_index(conn, g.user_id)
+            with index.lock:
+                matches = index.search_text(query, limit)
+            results = load_search_results(conn.cursor(), matches)
+        
+        return jsonify({'query': query, 'results': results})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analyze-prescription', methods=['POST'])
 def analyze_prescription():
     """Analyze prescription image"""
@@ -353,66 +694,14 @@ def analyze_prescription():
             return jsonify({'error': 'No image data provided'}), 400
         
         # Extract prescription information
-        extraction_prompt = """
-        Please analyze this prescription image and extract the following information:
-        1. Patient name (if visible)
-        2. Doctor name and clinic/hospital
-        3. Date of prescription
-        4. List of all prescribed medicines with their:
-           - Generic name and brand name (if available)
-           - Dosage (strength)
-           - Frequency (how often to take)
-           - Duration (how long to take)
-           - Special instructions
-        
-        Format the response as a structured JSON with the following format:
-        {
-            "patient_name": "...",
-            "doctor_name": "...",
-            "clinic": "...",
-            "date": "...",
-            "medicines": [
-                {
-                    "name": "...",
-                    "generic_name": "...",
-                    "dosage": "...",
-                    "frequency": "...",
-                    "duration": "...",
-                    "instructions": "..."
-                }
-            ]
-        }
-        """
-        
-        extracted_info = process_image_with_gemini(image_data, extraction_prompt)
+        extracted_info = process_image_with_gemini(image_data, PRESCRIPTION_EXTRACTION_PROMPT)
         
         # Analyze medicine purposes
-        analysis_prompt = f"""
-        Based on the following prescription information, please provide a detailed explanation for each medicine:
-        
-        {extracted_info}
-        
-        For each medicine, explain:
-        1. What condition or symptom it treats
-        2. How it works in the body
-        3. Why the doctor might have prescribed it
-        4. Important things the patient should know
-        
-        Provide the response in a clear, patient-friendly format that helps them understand their treatment.
-        """
-        
+        analysis_prompt = PRESCRIPTION_ANALYSIS_PROMPT.format(extracted_info=extracted_info)
         medicine_analysis = process_image_with_gemini(image_data, analysis_prompt)
         
         # Save to database
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO prescriptions (filename, medicines, analysis)
-            VALUES (?, ?, ?)
-        ''', (filename, extracted_info, medicine_analysis))
-        prescription_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        prescription_id = save_prescription(g.user_id, filename, extracted_info, medicine_analysis)
         
         return jsonify({
             'id': prescription_id,
@@ -427,24 +716,13 @@ def analyze_prescription():
 
 @app.route('/api/prescriptions', methods=['GET'])
 def get_prescriptions():
-    """Get all prescriptions"""
+    """Get prescriptions, newest first, optionally paginated"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, filename, medicines, created_at
-            FROM prescriptions
-            ORDER BY created_at DESC
-        ''')
-        prescriptions = cursor.fetchall()
-        conn.close()
-        
-        return jsonify([{
-            'id': prescription[0],
-            'filename': prescription[1],
-            'medicines': prescription[2],
-            'created_at': prescription[3]
-        } for prescription in prescriptions])
+        limit, offset = get_page_args()
+        with get_db() as conn:
+            prescriptions = list_prescriptions(conn.cursor(), limit, offset)
+        
+        return jsonify(prescriptions)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -453,15 +731,15 @@ def get_prescriptions():
 def get_prescription(prescription_id):
     """Get specific prescription"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, filename, medicines, analysis, created_at
-            FROM prescriptions
-            WHERE id = ?
-        ''', (prescription_id,))
-        prescription = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, filename, medicines, created_at
+                FROM prescriptions
+                WHERE id = ?
+            ''', (prescription_id,))
+            prescription = cursor.fetchone()
+            analysis = get_cold_text(cursor, 'prescription_analyses', prescription_id) if prescription else None
         
         if not prescription:
             return jsonify({'error': 'Prescription not found'}), 404
@@ -470,8 +748,8 @@ def get_prescription(prescription_id):
             'id': prescription[0],
             'filename': prescription[1],
             'medicines': prescription[2],
-            'analysis': prescription[3],
-            'created_at': prescription[4]
+            'analysis': analysis,
+            'created_at': prescription[3]
         })
         
     except Exception as e:
@@ -500,32 +778,8 @@ def process_macro_speech():
         if 'error' in macro_data:
             return jsonify({'error': macro_data['error']}), 500
         
-        # Step 3: Save to database
-        entry_date = date.today().isoformat()
-        
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO macro_entries 
-            (user_input, transcribed_text, parsed_foods, total_calories, 
-             total_protein, total_carbs, total_fat, entry_date)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        ''', ('voice_input', transcribed_text, json.dumps(macro_data['foods']),
-              macro_data['total_calories'], macro_data['total_protein'],
-              macro_data['total_carbs'], macro_data['total_fat'], entry_date))
-        
-        entry_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        
-        # Step 4: Update daily statistics
-        update_daily_macro_stats(
-            entry_date,
-            macro_data['total_calories'],
-            macro_data['total_protein'],
-            macro_data['total_carbs'],
-            macro_data['total_fat']
-        )
+        # Step 3: Save to database and update daily statistics
+        entry_id, entry_date = save_macro_entry(g.user_id, transcribed_text, macro_data)
         
         return jsonify({
             'id': entry_id,
@@ -540,29 +794,13 @@ def process_macro_speech():
 
 @app.route('/api/macro-entries', methods=['GET'])
 def get_macro_entries():
-    """Get all macro entries"""
+    """Get macro entries, newest first, optionally paginated"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, transcribed_text, total_calories, total_protein, 
-                   total_carbs, total_fat, entry_date, created_at
-            FROM macro_entries
-            ORDER BY created_at DESC
-        ''')
-        entries = cursor.fetchall()
-        conn.close()
-        
-        return jsonify([{
-            'id': entry[0],
-            'transcribed_text': entry[1],
-            'total_calories': entry[2],
-            'total_protein': entry[3],
-            'total_carbs': entry[4],
-            'total_fat': entry[5],
-            'entry_date': entry[6],
-            'created_at': entry[7]
-        } for entry in entries])
+        limit, offset = get_page_args()
+        with get_db() as conn:
+            entries = list_macro_entries(conn.cursor(), limit, offset)
+        
+        return jsonify(entries)
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -573,27 +811,23 @@ def get_daily_macro_stats():
     try:
         days = request.args.get('days', 7, type=int)  # Default last 7 days
         
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT entry_date, total_calories, total_protein, total_carbs, 
-                   total_fat, meal_count, updated_at
-            FROM daily_macro_stats
-            ORDER BY entry_date DESC
-            LIMIT ?
-        ''', (days,))
-        stats = cursor.fetchall()
-        conn.close()
-        
-        return jsonify([{
-            'entry_date': stat[0],
-            'total_calories': stat[1],
-            'total_protein': stat[2],
-            'total_carbs': stat[3],
-            'total_fat': stat[4],
-            'meal_count': stat[5],
-            'updated_at': stat[6]
-        } for stat in stats])
+        with get_db() as conn:
+            stats = list_daily_macro_stats(conn.cursor(), days)
+        
+        return jsonify(stats)
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    """Get the first page of every list plus recent macro stats in one request"""
+    try:
+        page_size = request.args.get('limit', DASHBOARD_PAGE_SIZE, type=int)
+        if not 1 <= page_size <= DASHBOARD_MAX_PAGE_SIZE:
+            return jsonify({'error': f'limit must be between 1 and {DASHBOARD_MAX_PAGE_SIZE}'}), 400
+        
+        return jsonify(get_dashboard_payload(g.user_id, page_size))
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -602,17 +836,16 @@ def get_daily_macro_stats():
 def get_macro_entry(entry_id):
     """Get specific macro entry with detailed food breakdown"""
     try:
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT id, user_input, transcribed_text, parsed_foods, 
-                   total_calories, total_protein, total_carbs, total_fat,
-                   entry_date, created_at
-            FROM macro_entries
-            WHERE id = ?
-        ''', (entry_id,))
-        entry = cursor.fetchone()
-        conn.close()
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, user_input, transcribed_text, parsed_foods, 
+                       total_calories, total_protein, total_carbs, total_fat,
+                       entry_date, created_at
+                FROM macro_entries
+                WHERE id = ?
+            ''', (entry_id,))
+            entry = cursor.fetchone()
         
         if not entry:
             return jsonify({'error': 'Entry not found'}), 404
@@ -756,55 +989,51 @@ Medications Prescribed:
         # Create random medical record
         record_data = random.choice(sample_medical_records)
         
-        conn = sqlite3.connect('medical_records.db')
-        cursor = conn.cursor()
-        
-        # Insert medical record
-        cursor.execute('''
-            INSERT INTO medical_records (filename, original_text, summary)
-            VALUES (?, ?, ?)
-        ''', (filename, record_data['original_text'], record_data['summary']))
-        record_id = cursor.lastrowid
-        
-        # Insert random prescription
-        prescription_data = random.choice(sample_prescriptions)
-        cursor.execute('''
-            INSERT INTO prescriptions (filename, medicines, analysis)
-            VALUES (?, ?, ?)
-        ''', (f"prescription_{filename}", prescription_data['medicines'], prescription_data['analysis']))
-        prescription_id = cursor.lastrowid
-        
-        # Insert random macro entries
-        entry_date = date.today().isoformat()
-        total_daily_calories = 0
-        total_daily_protein = 0
-        total_daily_carbs = 0
-        total_daily_fat = 0
-        
-        for macro_entry in sample_macro_entries:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            
+            # Insert medical record
             cursor.execute('''
-                INSERT INTO macro_entries 
-                (user_input, transcribed_text, parsed_foods, total_calories, 
-                 total_protein, total_carbs, total_fat, entry_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', ('sample_data', macro_entry['transcribed_text'], json.dumps(macro_entry['foods']),
-                  macro_entry['total_calories'], macro_entry['total_protein'],
-                  macro_entry['total_carbs'], macro_entry['total_fat'], entry_date))
+                INSERT INTO medical_records (filename, summary)
+                VALUES (?, ?)
+            ''', (filename, record_data['summary']))
+            record_id = cursor.lastrowid
+            put_cold_text(cursor, 'medical_record_texts', record_id, record_data['original_text'])
             
-            total_daily_calories += macro_entry['total_calories']
-            total_daily_protein += macro_entry['total_protein']
-            total_daily_carbs += macro_entry['total_carbs']
-            total_daily_fat += macro_entry['total_fat']
-        
-        # Update daily macro stats
-        cursor.execute('''
-            INSERT OR REPLACE INTO daily_macro_stats 
-            (entry_date, total_calories, total_protein, total_carbs, total_fat, meal_count)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (entry_date, total_daily_calories, total_daily_protein, total_daily_carbs, total_daily_fat, 3))
+            # Insert random prescription
+            prescription_data = random.choice(sample_prescriptions)
+            cursor.execute('''
+                INSERT INTO prescriptions (filename, medicines_preview, medicines)
+                VALUES (?, ?, ?)
+            ''', (f"prescription_{filename}", preview_text(prescription_data['medicines']),
+                  prescription_data['medicines']))
+            prescription_id = cursor.lastrowid
+            put_cold_text(cursor, 'prescription_analyses', prescription_id, prescription_data['analysis'])
+            
+            # Insert random macro entries
+            entry_date = date.today().isoformat()
+            daily_totals = [0, 0, 0, 0, 0]
+            
+            for macro_entry in sample_macro_entries:
+                cursor.execute('''
+                    INSERT INTO macro_entries 
+                    (user_input, transcribed_text, parsed_foods, total_calories, 
+                     total_protein, total_carbs, total_fat, entry_date)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', ('sample_data', macro_entry['transcribed_text'], json.dumps(macro_entry['foods']),
+                      macro_entry['total_calories'], macro_entry['total_protein'],
+                      macro_entry['total_carbs'], macro_entry['total_fat'], entry_date))
+                
+                daily_totals[0] += macro_entry['total_calories']
+                daily_totals[1] += macro_entry['total_protein']
+                daily_totals[2] += macro_entry['total_carbs']
+                daily_totals[3] += macro_entry['total_fat']
+                daily_totals[4] += 1
+            
+            # Add to (rather than overwrite) today's macro stats
+            synthetic_data.add_daily_macro_totals(cursor, {entry_date: daily_totals})
         
-        conn.commit()
-        conn.close()
+        update_embedding_index(g.user_id)
         
         return jsonify({
             'medical_record_id': record_id,
@@ -816,6 +1045,48 @@ Medications Prescribed:
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/generate-synthetic-data', methods=['POST'])
+def generate_synthetic_data():
+    """Bulk-generate synthetic data for the current user for scale testing"""
+    if not ENABLE_SYNTHETIC_DATA:
+        return jsonify({'error': 'Synthetic data generation is disabled'}), 404
+    if not g.user_id.startswith(synthetic_data.SYNTHETIC_USER_PREFIX):
+        return jsonify({'error': f'Synthetic data can only be generated for '
+                                 f'{synthetic_data.SYNTHETIC_USER_PREFIX}* users'}), 403
+    
+    try:
+        data = request.json or {}
+        records = int(data.get('records', 0))
+        prescriptions = int(data.get('prescriptions', 0))
+        macro_entries = int(data.get('macro_entries', 0))
+        start = date.fromisoformat(data['start_date']) if data.get('start_date') else None
+        end = date.fromisoformat(data['end_date']) if data.get('end_date') else None
+        
+        if min(records, prescriptions, macro_entries) < 0:
+            return jsonify({'error': 'Row counts must not be negative'}), 400
+        if records + prescriptions + macro_entries > MAX_SYNTHETIC_ROWS:
+            return jsonify({'error': f'At most {MAX_SYNTHETIC_ROWS} rows can be generated per request'}), 400
+        
+        with get_db() as conn:
+            counts = synthetic_data.generate(
+                conn, records, prescriptions, macro_entries, start, end,
+                seed=data.get('seed'),
+                batch_size=int(data.get('batch_size', synthetic_data.DEFAULT_BATCH_SIZE))
+            )
+        
+        # Embed the new rows now rather than on the next related/search request
+        update_embedding_index(g.user_id)
+        
+        return jsonify({
+            'created': counts,
+            'message': 'Synthetic data generated successfully'
+        })
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
 
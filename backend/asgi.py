@@ -0,0 +1,296 @@
+"""Async (ASGI) serving mode.
+
+Serves the same routes as app.py under an ASGI server. The endpoints that
+wait on Gemini run as coroutines, so an in-flight model call holds no
+thread and one process can keep hundreds of uploads waiting on the model.
+Blocking work still runs on threads, each kind on its own bounded pool:
+SQLite access, image decoding and the synchronous Gemini file upload.
+Every other route is the Flask app itself, run on a thread pool.
+
+    uvicorn asgi:app --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import base64
+import io
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import google.generativeai as genai
+from a2wsgi import WSGIMiddleware
+from PIL import Image
+
+import app as backend
+import macro_parsing
+
+DB_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DB_EXECUTOR_WORKERS', '8')), thread_name_prefix='sqlite')
+IMAGE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 4, thread_name_prefix='image-decode')
+UPLOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv('UPLOAD_EXECUTOR_WORKERS', '32')), thread_name_prefix='gemini-upload')
+
+# Threads serving the synchronous Flask routes
+FLASK_WORKERS = int(os.getenv('FLASK_WORKERS', '16'))
+
+# Largest request body accepted by the async routes (base64 uploads)
+MAX_BODY_BYTES = int(os.getenv('MAX_BODY_BYTES', str(32 * 1024 * 1024)))
+# Bodies larger than this are JSON-decoded off the event loop
+JSON_OFFLOAD_BYTES = 256 * 1024
+
+# Upload formats sent to Gemini as they are; others are re-encoded as PNG
+GEMINI_IMAGE_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+class BodyTooLarge(Exception):
+    """Raised when a request body exceeds MAX_BODY_BYTES"""
+
+
+async def run_in(executor, func, *args, **kwargs):
+    """Run a blocking call on ``executor`` without blocking the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+async def generate_content_async(contents, generation_config=None):
+    """Await a Gemini response and return its text"""
+    model = genai.GenerativeModel(backend.GEMINI_MODEL, generation_config=generation_config)
+    response = await model.generate_content_async(contents)
+    return response.text
+
+async def process_image_with_gemini_async(blob, prompt):
+    """Async counterpart of process_image_with_gemini for a blob from image_blob"""
+    try:
+        return await generate_content_async([prompt, blob])
+    except Exception as e:
+        return f"Error processing image: {str(e)}"
+
+async def generate_summary_async(text):
+    """Async counterpart of generate_summary"""
+    try:
+        return await generate_content_async(backend.SUMMARY_PROMPT.format(text=text))
+    except Exception as e:
+        return f"Error generating summary: {str(e)}"
+
+async def process_audio_with_gemini_async(audio_data):
+    """Async counterpart of process_audio_with_gemini"""
+    try:
+        audio_file = await run_in(UPLOAD_EXECUTOR, backend.upload_audio, audio_data)
+        return await generate_content_async([backend.TRANSCRIPTION_PROMPT, audio_file])
+    except Exception as e:
+        return f"Error processing audio: {str(e)}"
+
+async def parse_food_and_calculate_macros_async(transcribed_text):
+    """Async counterpart of parse_food_and_calculate_macros"""
+    try:
+        return await macro_parsing.parse_macros_async(
+            transcribed_text,
+            partial(generate_content_async, generation_config=macro_parsing.JSON_OUTPUT_CONFIG))
+    except Exception as e:
+        return macro_parsing.failure_result(e)
+
+def image_blob(image_data):
+    """Check a base64 data URL image and return it as a Gemini blob dict.
+
+    The model client re-encodes PIL images before every call, so the
+    upload's own bytes are sent instead. The image is still fully decoded
+    here to reject corrupt uploads, and formats Gemini does not take are
+    converted to PNG once.
+    """
+    image_bytes = base64.b64decode(image_data.split(',')[1])
+    image = Image.open(io.BytesIO(image_bytes))
+    image.load()
+    mime_type = GEMINI_IMAGE_TYPES.get(image.format)
+    if mime_type is None:
+        if image.mode not in ('1', 'L', 'LA', 'P', 'RGB', 'RGBA'):
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format='PNG')
+        image_bytes, mime_type = output.getvalue(), 'image/png'
+    return {'mime_type': mime_type, 'data': image_bytes}
+
+async def decode_image_async(image_data):
+    """Prepare the uploaded image's blob off the event loop, or return the error message"""
+    try:
+        return await run_in(IMAGE_EXECUTOR, image_blob, image_data), None
+    except Exception as e:
+        return None, f"Error processing image: {str(e)}"
+
+async def upload_medical_record(user_id, data):
+    """Upload and process medical record image"""
+    image_data = data.get('image')
+    filename = data.get('filename', 'medical_record.jpg')
+
+    if not image_data:
+        return {'error': 'No image data provided'}, 400
+
+    # Process image with Gemini
+    blob, error = await decode_image_async(image_data)
+    extracted_text = error or await process_image_with_gemini_async(blob, backend.MEDICAL_RECORD_OCR_PROMPT)
+
+    # Generate summary
+    summary = await generate_summary_async(extracted_text)
+
+    # Save to database
+    record_id = await run_in(DB_EXECUTOR, backend.save_medical_record, user_id, filename, extracted_text, summary)
+
+    return {
+        'id': record_id,
+        'filename': filename,
+        'extracted_text': extracted_text,
+        'summary': summary,
+        'message': 'Medical record processed successfully'
+    }, 200
+
+async def analyze_prescription(user_id, data):
+    """Analyze prescription image"""
+    image_data = data.get('image')
+    filename = data.get('filename', 'prescription.jpg')
+
+    if not image_data:
+        return {'error': 'No image data provided'}, 400
+
+    # Prepare the blob once and reuse it for both model calls
+    blob, error = await decode_image_async(image_data)
+
+    # Extract prescription information
+    extracted_info = error or await process_image_with_gemini_async(blob, backend.PRESCRIPTION_EXTRACTION_PROMPT)
+
+    # Analyze medicine purposes
+    analysis_prompt = backend.PRESCRIPTION_ANALYSIS_PROMPT.format(extracted_info=extracted_info)
+    medicine_analysis = error or await process_image_with_gemini_async(blob, analysis_prompt)
+
+    # Save to database
+    prescription_id = await run_in(DB_EXECUTOR, backend.save_prescription,
+                                   user_id, filename, extracted_info, medicine_analysis)
+
+    return {
+        'id': prescription_id,
+        'filename': filename,
+        'extracted_info': extracted_info,
+        'analysis': medicine_analysis,
+        'message': 'Prescription analyzed successfully'
+    }, 200
+
+async def process_macro_speech(user_id, data):
+    """Process audio for macro tracking"""
+    audio_data = data.get('audio')
+
+    if not audio_data:
+        return {'error': 'No audio data provided'}, 400
+
+    # Step 1: Convert speech to text using Gemini
+    transcribed_text = await process_audio_with_gemini_async(audio_data)
+
+    if transcribed_text.startswith('Error'):
+        return {'error': transcribed_text}, 500
+
+    # Step 2: Parse food items and calculate macros
+    macro_data = await parse_food_and_calculate_macros_async(transcribed_text)
+
+    if 'error' in macro_data:
+        return {'error': macro_data['error']}, 500
+
+    # Step 3: Save to database and update daily statistics
+    entry_id, entry_date = await run_in(DB_EXECUTOR, backend.save_macro_entry,
+                                        user_id, transcribed_text, macro_data)
+
+    return {
+        'id': entry_id,
+        'transcribed_text': transcribed_text,
+        'macro_data': macro_data,
+        'entry_date': entry_date,
+        'message': 'Macro entry processed successfully'
+    }, 200
+
+# Routes served natively async; everything else goes to the Flask app
+ASYNC_ROUTES = {
+    ('POST', '/api/upload-medical-record'): upload_medical_record,
+    ('POST', '/api/analyze-prescription'): analyze_prescription,
+    ('POST', '/api/process-macro-speech'): process_macro_speech,
+}
+
+flask_app = WSGIMiddleware(backend.app, workers=FLASK_WORKERS)
+
+async def read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise BodyTooLarge()
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+async def read_json(receive):
+    body = await read_body(receive)
+    if len(body) > JSON_OFFLOAD_BYTES:
+        return await run_in(IMAGE_EXECUTOR, json.loads, body)
+    return json.loads(body or b'{}')
+
+async def send_json(send, payload, status):
+    body = json.dumps(payload).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            # Matches flask-cors' default for the Flask routes
+            (b'access-control-allow-origin', b'*'),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def handle_async_route(handler, scope, receive, send):
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+    user_id, error = backend.authenticate_request(headers)
+    if error:
+        message, status = error
+        return await send_json(send, {'error': message}, status)
+
+    try:
+        data = await read_json(receive)
+    except BodyTooLarge:
+        return await send_json(send, {'error': 'Request body too large'}, 413)
+    except ValueError:
+        return await send_json(send, {'error': 'Request body must be JSON'}, 400)
+    if not isinstance(data, dict):
+        return await send_json(send, {'error': 'Request body must be a JSON object'}, 400)
+
+    try:
+        payload, status = await handler(user_id, data)
+    except Exception as e:
+        payload, status = {'error': str(e)}, 500
+    await send_json(send, payload, status)
+
+async def handle_lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for executor in (DB_EXECUTOR, IMAGE_EXECUTOR, UPLOAD_EXECUTOR):
+                executor.shutdown(wait=True)
+            backend.shard_pool.close_all()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def app(scope, receive, send):
+    """ASGI entry point"""
+    if scope['type'] == 'lifespan':
+        return await handle_lifespan(receive, send)
+
+    if scope['type'] == 'http':
+        handler = ASYNC_ROUTES.get((scope['method'], scope['path']))
+        if handler:
+            return await handle_async_route(handler, scope, receive, send)
+
+    await flask_app(scope, receive, send)
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(app, host='0.0.0.0', port=5000)
@@ -0,0 +1,204 @@
+"""Benchmark the cold storage migration.
+
+Builds a database in the pre-migration layout, with OCR text and analyses
+inline and the same newest-first list indexes, then migrates a copy with
+ensure_cold_storage and reports file size plus list and detail query
+latency for both.
+
+    python bench_cold_storage.py --rows 20000
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from cold_storage import ensure_cold_storage, get_cold_text, PREVIEW_CHARS
+
+LEGACY_SCHEMA = [
+    '''
+    CREATE TABLE medical_records (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        original_text TEXT,
+        summary TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE prescriptions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        filename TEXT NOT NULL,
+        medicines TEXT,
+        analysis TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE macro_entries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_input TEXT NOT NULL,
+        transcribed_text TEXT,
+        parsed_foods TEXT,
+        total_calories REAL DEFAULT 0,
+        total_protein REAL DEFAULT 0,
+        total_carbs REAL DEFAULT 0,
+        total_fat REAL DEFAULT 0,
+        entry_date DATE DEFAULT CURRENT_DATE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+]
+
+LEGACY_LIST_INDEXES = [
+    'CREATE INDEX legacy_records_recent ON medical_records (created_at DESC, id DESC)',
+    'CREATE INDEX legacy_prescriptions_recent ON prescriptions (created_at DESC, id DESC)',
+]
+
+# Match the app's first page
+PAGE_SIZE = 20
+
+PATIENTS = ['John Smith', 'Sarah Johnson', 'Michael Brown', 'Priya Patel', 'Wei Chen']
+DIAGNOSES = ['Hypertension', 'Type 2 Diabetes Mellitus', 'Asthma', 'Hypothyroidism',
+             'Anxiety-related chest pain', 'Seasonal allergic rhinitis']
+MEDICINES = ['Lisinopril 10mg', 'Metformin 500mg', 'Atorvastatin 20mg', 'Levothyroxine 50mcg',
+             'Salbutamol inhaler', 'Cetirizine 10mg', 'Aspirin 81mg']
+
+def make_record_text(rng):
+    lines = [
+        f"Patient: {rng.choice(PATIENTS)}",
+        f"Date of Visit: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        f"Chief Complaint: {rng.choice(DIAGNOSES)} follow-up",
+        f"Vital Signs: BP {rng.randint(100, 160)}/{rng.randint(60, 100)}, HR {rng.randint(55, 110)}",
+    ]
+    for _ in range(rng.randint(20, 60)):
+        lines.append(f"Assessment: {rng.choice(DIAGNOSES)}. Plan: continue {rng.choice(MEDICINES)}, "
+                     f"follow up in {rng.randint(1, 12)} weeks. Reading {rng.random():.4f}.")
+    return '\n'.join(lines)
+
+def make_prescription_text(rng):
+    """A full prescription extraction; these run to several kilobytes in practice"""
+    lines = [
+        f"Patient: {rng.choice(PATIENTS)}",
+        f"Date: 2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "Medications Prescribed:",
+    ]
+    for number in range(1, rng.randint(4, 8)):
+        medicine = rng.choice(MEDICINES)
+        lines.append(
+            f"{number}. {medicine} - Take {rng.choice(['once', 'twice', 'three times'])} daily "
+            f"for {rng.randint(5, 90)} days. Instructions: {rng.choice(DIAGNOSES)}; "
+            + ' '.join(rng.choice(MEDICINES) for _ in range(rng.randint(20, 60))))
+    return '\n'.join(lines)
+
+def make_analysis(rng):
+    sections = []
+    for medicine in rng.sample(MEDICINES, 3):
+        sections.append(
+            f"**{medicine}**\n"
+            f"**What condition or symptom it treats:** {rng.choice(DIAGNOSES)}.\n"
+            f"**How it works in the body:** " + ' '.join(rng.choice(MEDICINES) for _ in range(30)) + "\n"
+            "**Important things the patient should know:** Take once daily with food. "
+            "Consult your doctor or pharmacist before stopping this medication.\n"
+        )
+    return '\n'.join(sections)
+
+def build_legacy_db(path, rows, seed):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    for statement in LEGACY_SCHEMA:
+        conn.execute(statement)
+    conn.executemany(
+        'INSERT INTO medical_records (filename, original_text, summary) VALUES (?, ?, ?)',
+        ((f"record_{i}.jpg", make_record_text(rng), f"{rng.choice(DIAGNOSES)} visit summary")
+         for i in range(rows)))
+    conn.executemany(
+        'INSERT INTO prescriptions (filename, medicines, analysis) VALUES (?, ?, ?)',
+        ((f"prescription_{i}.jpg", make_prescription_text(rng), make_analysis(rng))
+         for i in range(rows)))
+    # Give the legacy layout the same list indexes, so the comparison
+    # measures moving the text out rather than adding the indexes
+    for statement in LEGACY_LIST_INDEXES:
+        conn.execute(statement)
+    conn.commit()
+    conn.execute('VACUUM')
+    conn.close()
+
+def time_query(conn, sql, params=(), repeat=20):
+    """Median wall time of a query in milliseconds, dropping the SQLite page cache before each run"""
+    samples = []
+    for _ in range(repeat):
+        conn.execute('PRAGMA shrink_memory')
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def time_detail(conn, record_ids, legacy):
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    for record_id in record_ids:
+        if legacy:
+            cursor.execute('SELECT original_text FROM medical_records WHERE id = ?', (record_id,))
+            cursor.fetchone()
+        else:
+            get_cold_text(cursor, 'medical_record_texts', record_id)
+    return (time.perf_counter() - start) * 1000 / len(record_ids)
+
+def measure(path, legacy, rows, seed):
+    conn = sqlite3.connect(path)
+    record_ids = random.Random(seed).sample(range(1, rows + 1), min(rows, 200))
+    # The list endpoints' page query: newest rows first, previewing the text column
+    page = (PREVIEW_CHARS, PAGE_SIZE)
+    # Migrated databases keep a short inline preview of the medicines text
+    prescription_preview = f'substr(medicines, 1, {PREVIEW_CHARS})' if legacy else 'medicines_preview'
+    result = {
+        'size_mb': os.path.getsize(path) / 1024 / 1024,
+        'records_page_ms': time_query(conn, '''
+            SELECT id, filename, substr(summary, 1, ?), created_at FROM medical_records
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        ''', page),
+        'prescriptions_page_ms': time_query(conn, f'''
+            SELECT id, filename, {prescription_preview}, created_at FROM prescriptions
+            ORDER BY created_at DESC, id DESC LIMIT ?
+        ''', (PAGE_SIZE,)),
+        'record_detail_ms': time_detail(conn, record_ids, legacy),
+    }
+    conn.close()
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000, help='rows per table')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='cold_storage_bench_')
+    try:
+        before_path = os.path.join(workdir, 'before.db')
+        after_path = os.path.join(workdir, 'after.db')
+
+        build_legacy_db(before_path, args.rows, args.seed)
+        shutil.copyfile(before_path, after_path)
+
+        conn = sqlite3.connect(after_path)
+        start = time.perf_counter()
+        ensure_cold_storage(conn)
+        migration_s = time.perf_counter() - start
+        conn.close()
+
+        before = measure(before_path, True, args.rows, args.seed)
+        after = measure(after_path, False, args.rows, args.seed)
+
+        print(f"{args.rows} rows per table, migration took {migration_s:.2f}s")
+        print(f"{'metric':<24}{'before':>12}{'after':>12}")
+        for key in before:
+            print(f"{key:<24}{before[key]:>12.2f}{after[key]:>12.2f}")
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main()
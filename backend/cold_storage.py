@@ -0,0 +1,176 @@
+import zlib
+
+# Preset dictionary shared by every compressed blob. zlib primes its window
+# with these bytes, so phrases that recur across OCR transcripts and
+# medicine explanations compress well even in short documents. It is
+# hand-curated from the headings our prompts ask Gemini for and common
+# medical record phrasing, not trained on a corpus. The most frequent
+# strings go last, closest to the data being compressed.
+# Never edit a dictionary in place: add a new id and point
+# CURRENT_DICTIONARY_ID at it so existing blobs stay readable.
+_DICTIONARY_V1 = (
+    "Emergency Department Visit\n"
+    "Laboratory Results\nReference Range\nHemoglobin\nHbA1c\nCholesterol\n"
+    "Blood Glucose: Fasting mg/dL\nECG: Normal sinus rhythm\nChest X-ray: \n"
+    "Vital Signs: BP HR Temp Weight Height \n"
+    "Allergies: No known drug allergies\n"
+    "Follow up in weeks\nNext appointment: months\n"
+    "Discharge: Stable condition\n"
+    "Assessment: \nPlan: \nRecommendations: \nHistory of Present Illness: \n"
+    "Chief Complaint: \nDiagnosis: \nTreatment: \nCurrent Medications: \n"
+    "Doctor: Dr. \nClinic: \nHospital\nDate of Visit: \nDate: \nPatient: \n"
+    "**Important things the patient should know:** \n"
+    "**Why the doctor might have prescribed it:** \n"
+    "**How it works in the body:** \n"
+    "**What condition or symptom it treats:** \n"
+    "Side effects may include nausea, dizziness, headache. "
+    "Consult your doctor or pharmacist before stopping this medication. "
+    "Take with food. Take on an empty stomach. Avoid alcohol. "
+    "- Take once daily in the morning - Take twice daily with meals "
+    "- Take once daily at bedtime - Take three times daily - 30 day supply "
+    "tablet capsule syrup injection units mg mcg ml "
+    "\"generic_name\": \"dosage\": \"frequency\": \"duration\": "
+    "\"instructions\": \"medicines\": [{\"name\": "
+    "\"patient_name\": \"doctor_name\": \"clinic\": \"date\": "
+    "Medications Prescribed:\n1. \n2. \n3. \n"
+    "**Patient Information:**\n**Diagnosis:**\n**Medications:**\n"
+    "**Treatment:**\n* **\n"
+).encode('utf-8')
+
+DICTIONARIES = {
+    1: _DICTIONARY_V1,
+}
+
+# Header byte for blobs compressed without a preset dictionary
+NO_DICTIONARY = 0
+CURRENT_DICTIONARY_ID = 1
+COMPRESSION_LEVEL = 9
+
+# Side tables holding large text fields, keyed by the owning row's id.
+# Maps side table -> (owner table, owner key column, text column)
+COLD_TABLES = {
+    'medical_record_texts': ('medical_records', 'record_id', 'original_text'),
+    'prescription_analyses': ('prescriptions', 'prescription_id', 'analysis'),
+}
+
+# Characters of a large text column kept inline as its list preview
+PREVIEW_CHARS = 300
+
+# Inline previews of text columns too large to read for a list page.
+# Maps table -> (text column, preview column)
+PREVIEW_COLUMNS = {
+    'prescriptions': ('medicines', 'medicines_preview'),
+}
+
+# Indexes giving the list endpoints their newest-first order, so a page
+# reads only its own rows. Full text columns stay out of the keys:
+# prescription extractions run to kilobytes and would spill into overflow
+# pages, so the prescription index covers the short preview instead.
+LIST_INDEXES = {
+    'idx_medical_records_recent': 'medical_records (created_at DESC, id DESC)',
+    'idx_prescriptions_page': 'prescriptions (created_at DESC, id DESC, filename, medicines_preview)',
+    'idx_macro_entries_recent': 'macro_entries (created_at DESC, id DESC)',
+}
+
+# Earlier list indexes, dropped when a shard opens
+RETIRED_INDEXES = (
+    'idx_medical_records_list',
+    'idx_prescriptions_list',
+    'idx_macro_entries_list',
+    'idx_prescriptions_recent',
+)
+
+def compress_text(text, dictionary_id=CURRENT_DICTIONARY_ID):
+    """Compress text into a blob tagged with the dictionary it was built with"""
+    if text is None:
+        return None
+    if dictionary_id == NO_DICTIONARY:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL)
+    else:
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=DICTIONARIES[dictionary_id])
+    data = compressor.compress(text.encode('utf-8')) + compressor.flush()
+    return bytes([dictionary_id]) + data
+
+def decompress_text(blob):
+    """Inverse of compress_text"""
+    if blob is None:
+        return None
+    dictionary_id = blob[0]
+    if dictionary_id == NO_DICTIONARY:
+        decompressor = zlib.decompressobj()
+    else:
+        decompressor = zlib.decompressobj(zdict=DICTIONARIES[dictionary_id])
+    return (decompressor.decompress(blob[1:]) + decompressor.flush()).decode('utf-8')
+
+def preview_text(text):
+    """The inline list preview stored alongside a large text column"""
+    return text[:PREVIEW_CHARS] if text is not None else None
+
+def put_cold_text(cursor, table, owner_id, text):
+    """Store the compressed text for a row in one of the COLD_TABLES"""
+    _, key_column, text_column = COLD_TABLES[table]
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO {table} ({key_column}, {text_column})
+        VALUES (?, ?)
+    ''', (owner_id, compress_text(text)))
+
+def get_cold_text(cursor, table, owner_id):
+    """Load and decompress the text for a row, or None if there is none"""
+    _, key_column, text_column = COLD_TABLES[table]
+    cursor.execute(f'''
+        SELECT {text_column} FROM {table} WHERE {key_column} = ?
+    ''', (owner_id,))
+    row = cursor.fetchone()
+    return decompress_text(row[0]) if row else None
+
+def _columns(cursor, table):
+    cursor.execute(f'PRAGMA table_info({table})')
+    return {row[1] for row in cursor.fetchall()}
+
+def ensure_cold_storage(conn):
+    """Create the cold storage tables and list indexes, migrating legacy rows.
+
+    Databases created before cold storage keep large text inline in the
+    owner tables. Those columns are compressed into the side tables and
+    dropped, then the file is vacuumed to give the pages back. Returns True
+    if a migration ran.
+    """
+    cursor = conn.cursor()
+    migrated = False
+
+    for table, (owner_table, key_column, text_column) in COLD_TABLES.items():
+        cursor.execute(f'''
+            CREATE TABLE IF NOT EXISTS {table} (
+                {key_column} INTEGER PRIMARY KEY
+                    REFERENCES {owner_table}(id) ON DELETE CASCADE,
+                {text_column} BLOB
+            )
+        ''')
+
+        if text_column in _columns(cursor, owner_table):
+            conn.create_function('compress_text', 1, compress_text, deterministic=True)
+            cursor.execute(f'''
+                INSERT OR REPLACE INTO {table} ({key_column}, {text_column})
+                SELECT id, compress_text({text_column})
+                FROM {owner_table}
+                WHERE {text_column} IS NOT NULL
+            ''')
+            cursor.execute(f'ALTER TABLE {owner_table} DROP COLUMN {text_column}')
+            migrated = True
+
+    for table, (text_column, preview_column) in PREVIEW_COLUMNS.items():
+        if preview_column not in _columns(cursor, table):
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {preview_column} TEXT')
+            cursor.execute(f'UPDATE {table} SET {preview_column} = substr({text_column}, 1, ?)',
+                           (PREVIEW_CHARS,))
+
+    for name in RETIRED_INDEXES:
+        cursor.execute(f'DROP INDEX IF EXISTS {name}')
+    for name, target in LIST_INDEXES.items():
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {target}')
+
+    conn.commit()
+
+    if migrated:
+        conn.execute('VACUUM')
+    return migrated
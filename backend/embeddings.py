@@ -0,0 +1,281 @@
+import json
+import os
+import re
+import threading
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+# Kinds of rows that can be indexed: kind -> (code, table, text column)
+INDEXED_KINDS = {
+    'medical_record': (0, 'medical_records', 'summary'),
+    'prescription': (1, 'prescriptions', 'medicines'),
+}
+KIND_BY_CODE = {code: kind for kind, (code, _, _) in INDEXED_KINDS.items()}
+
+INITIAL_CAPACITY = 1024
+SYNC_BATCH_SIZE = 5000
+# Rows processed at a time when recomputing IDF-weighted norms
+NORM_CHUNK_SIZE = 8192
+
+
+class HashedNgramEmbedder:
+    """Offline text embedder using hashed character n-grams.
+
+    Each text is lowercased, its character n-grams are hashed into ``dim``
+    buckets and bucket counts are dampened with log(1 + tf). The vectors
+    are not normalized: ``idf = True`` tells EmbeddingIndex to weight them
+    by the inverse document frequency of each bucket across the index and
+    compare them by cosine similarity. Needs no model download or training.
+    """
+
+    name = 'hashed-char-ngrams'
+    idf = True
+
+    # Multiplier for the polynomial rolling hash over UTF-8 bytes
+    _HASH_BASE = np.uint64(1099511628211)
+
+    def __init__(self, dim=512, ngram_range=(3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+
+    def _embed_one(self, text, out):
+        text = ' ' + re.sub(r'\s+', ' ', (text or '').lower()).strip() + ' '
+        data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.uint64)
+        buckets = []
+        for n in range(self.ngram_range[0], self.ngram_range[1] + 1):
+            count = len(data) - n + 1
+            if count <= 0:
+                break
+            # Hash every n-gram at once; uint64 arithmetic wraps on overflow
+            hashes = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = hashes * self._HASH_BASE + data[offset:offset + count]
+            # MurmurHash3 finalizer so every input byte reaches the low bits
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(0xff51afd7ed558ccd)
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(0xc4ceb9fe1a85ec53)
+            hashes ^= hashes >> np.uint64(33)
+            buckets.append(hashes % np.uint64(self.dim))
+        if not buckets:
+            return
+        counts = np.bincount(np.concatenate(buckets).astype(np.intp), minlength=self.dim)
+        out[:] = np.log1p(counts.astype(np.float32))
+
+    def embed(self, texts):
+        """Return a (len(texts), dim) float32 matrix of term weights"""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            self._embed_one(text, matrix[row])
+        return matrix
+
+
+# Embedders selectable by name. A model-backed embedder needs a ``name``,
+# a ``dim``, ``idf = False`` and an ``embed(texts)`` returning unit vectors.
+EMBEDDERS = {
+    HashedNgramEmbedder.name: HashedNgramEmbedder,
+}
+
+def register_embedder(name, factory):
+    """Make an embedder available to create_embedder under ``name``"""
+    EMBEDDERS[name] = factory
+
+def create_embedder(name=HashedNgramEmbedder.name):
+    return EMBEDDERS[name]()
+
+
+class EmbeddingIndex:
+    """Vectors for one user's records and prescriptions in memory-mapped files.
+
+    ``<prefix>.vectors.npy`` holds one embedder vector per row (term
+    weights for HashedNgramEmbedder, unit vectors for embedders with
+    ``idf = False``) and ``<prefix>.keys.npy`` the (kind code, row id)
+    each vector belongs to.
+    ``<prefix>.index.json`` records how many rows are valid and the highest
+    row id indexed per kind, so ``sync`` only embeds rows inserted since.
+    """
+
+    def __init__(self, prefix, embedder):
+        self.prefix = prefix
+        self.embedder = embedder
+        self.lock = threading.Lock()
+        # (row count, idf, weighted row norms) for the current contents
+        self._weights = None
+        self._vectors_path = f"{prefix}.vectors.npy"
+        self._keys_path = f"{prefix}.keys.npy"
+        self._meta_path = f"{prefix}.index.json"
+        self._load()
+
+    def _empty_meta(self):
+        return {
+            'embedder': self.embedder.name,
+            'dim': self.embedder.dim,
+            'count': 0,
+            'last_ids': {kind: 0 for kind in INDEXED_KINDS},
+        }
+
+    def _load(self):
+        meta = None
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+        # Vectors from a different embedder are not comparable; start over
+        if (not meta or meta['embedder'] != self.embedder.name or meta['dim'] != self.embedder.dim
+                or not os.path.exists(self._vectors_path) or not os.path.exists(self._keys_path)):
+            self.meta = self._empty_meta()
+            self._df = np.zeros(self.embedder.dim, dtype=np.int64)
+            self._allocate(INITIAL_CAPACITY)
+            self._save_meta()
+            return
+        self.meta = meta
+        self.vectors = np.load(self._vectors_path, mmap_mode='r+')
+        self.keys = np.load(self._keys_path, mmap_mode='r+')
+        self._df = np.zeros(self.embedder.dim, dtype=np.int64)
+        for start in range(0, meta['count'], NORM_CHUNK_SIZE):
+            end = min(start + NORM_CHUNK_SIZE, meta['count'])
+            self._df += (self.vectors[start:end] > 0).sum(axis=0)
+
+    def _allocate(self, capacity, count=0):
+        """(Re)create the backing files with room for ``capacity`` rows"""
+        vectors = np.lib.format.open_memmap(
+            self._vectors_path + '.tmp', mode='w+', dtype=np.float32,
+            shape=(capacity, self.embedder.dim))
+        keys = np.lib.format.open_memmap(
+            self._keys_path + '.tmp', mode='w+', dtype=np.int64, shape=(capacity, 2))
+        if count:
+            vectors[:count] = self.vectors[:count]
+            keys[:count] = self.keys[:count]
+        vectors.flush()
+        keys.flush()
+        del vectors, keys
+        os.replace(self._vectors_path + '.tmp', self._vectors_path)
+        os.replace(self._keys_path + '.tmp', self._keys_path)
+        self.vectors = np.load(self._vectors_path, mmap_mode='r+')
+        self.keys = np.load(self._keys_path, mmap_mode='r+')
+
+    def _save_meta(self):
+        with open(self._meta_path + '.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(self._meta_path + '.tmp', self._meta_path)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def add(self, kind, ids, texts):
+        """Append vectors for rows of ``kind``; ids must be increasing"""
+        if not ids:
+            return
+        count = self.meta['count']
+        needed = count + len(ids)
+        if needed > len(self.vectors):
+            capacity = len(self.vectors)
+            while capacity < needed:
+                capacity *= 2
+            self._allocate(capacity, count)
+        vectors = self.embedder.embed(texts)
+        self.vectors[count:needed] = vectors
+        self._df += (vectors > 0).sum(axis=0)
+        self.keys[count:needed, 0] = INDEXED_KINDS[kind][0]
+        self.keys[count:needed, 1] = ids
+        self.vectors.flush()
+        self.keys.flush()
+        # Only publish the new rows once their vectors are on disk
+        self.meta['count'] = needed
+        self.meta['last_ids'][kind] = max(self.meta['last_ids'][kind], ids[-1])
+        self._save_meta()
+
+    def sync(self, cursor):
+        """Embed every row inserted since the last sync. Returns rows added."""
+        added = 0
+        for kind, (_, table, column) in INDEXED_KINDS.items():
+            while True:
+                cursor.execute(f'''
+                    SELECT id, {column} FROM {table}
+                    WHERE id > ?
+                    ORDER BY id
+                    LIMIT ?
+                ''', (self.meta['last_ids'][kind], SYNC_BATCH_SIZE))
+                rows = cursor.fetchall()
+                if not rows:
+                    break
+                self.add(kind, [row[0] for row in rows], [row[1] for row in rows])
+                added += len(rows)
+        return added
+
+    def vector_for(self, kind, row_id):
+        """Return the stored vector for a row, or None if it is not indexed"""
+        count = self.meta['count']
+        matches = np.flatnonzero((self.keys[:count, 0] == INDEXED_KINDS[kind][0])
+                                 & (self.keys[:count, 1] == row_id))
+        return np.array(self.vectors[matches[0]]) if len(matches) else None
+
+    def _idf_weights(self):
+        """Return (idf, IDF-weighted norm of every row), cached until rows are added"""
+        count = self.meta['count']
+        if self._weights is None or self._weights[0] != count:
+            idf = (np.log((1 + count) / (1 + self._df)) + 1).astype(np.float32)
+            squared_idf = idf * idf
+            norms = np.empty(count, dtype=np.float32)
+            for start in range(0, count, NORM_CHUNK_SIZE):
+                chunk = self.vectors[start:min(start + NORM_CHUNK_SIZE, count)]
+                norms[start:start + len(chunk)] = np.sqrt((chunk * chunk) @ squared_idf)
+            norms[norms == 0] = 1
+            self._weights = (count, idf, norms)
+        return self._weights[1], self._weights[2]
+
+    def search(self, query_vector, limit=10, exclude=None):
+        """Top ``limit`` (kind, id, score) by cosine similarity to ``query_vector``"""
+        count = self.meta['count']
+        if not count or limit < 1:
+            return []
+        if self.embedder.idf:
+            # cos(d * idf, q * idf) == d . (q * idf^2) / (|d * idf| |q * idf|)
+            idf, norms = self._idf_weights()
+            weighted_query = query_vector * idf
+            query_norm = np.linalg.norm(weighted_query) or 1
+            scores = np.asarray(self.vectors[:count] @ (weighted_query * idf)) / (norms * query_norm)
+        else:
+            scores = np.asarray(self.vectors[:count] @ query_vector)
+        if exclude is not None:
+            kind, row_id = exclude
+            scores[(self.keys[:count, 0] == INDEXED_KINDS[kind][0])
+                   & (self.keys[:count, 1] == row_id)] = -np.inf
+        limit = min(limit, count)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(KIND_BY_CODE[int(self.keys[i, 0])], int(self.keys[i, 1]), float(scores[i]))
+                for i in top if np.isfinite(scores[i])]
+
+    def search_text(self, text, limit=10):
+        return self.search(self.embedder.embed([text])[0], limit)
+
+
+class EmbeddingIndexes:
+    """Per-user EmbeddingIndex instances behind a bounded LRU cache.
+
+    Evicted indexes that are still in use elsewhere are found again through
+    a weak reference, so there is never more than one live instance (and
+    writer) per user.
+    """
+
+    def __init__(self, data_dir, capacity=16, embedder=None):
+        self.data_dir = data_dir
+        self.capacity = capacity
+        self.embedder = embedder or create_embedder()
+        self._indexes = OrderedDict()
+        self._live = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            index = self._indexes.get(user_id) or self._live.get(user_id)
+            if index is None:
+                index = EmbeddingIndex(os.path.join(self.data_dir, user_id), self.embedder)
+                self._live[user_id] = index
+            self._indexes[user_id] = index
+            self._indexes.move_to_end(user_id)
+            while len(self._indexes) > self.capacity:
+                self._indexes.popitem(last=False)
+            return index
@@ -0,0 +1,329 @@
+"""Validated parsing of the model's food diary analysis.
+
+The model is asked for JSON output, and whatever comes back is checked
+against the expected shape before use. Numeric strings are coerced,
+truncated JSON is repaired locally, and totals are always recomputed
+from the food items. The model is asked again only for the part that
+failed: the food items that did not validate, or the foods lost when a
+response was cut off. The whole pipeline is never retried.
+
+The parsing steps are written as a generator that yields prompts and
+receives response texts, so the same logic runs under the synchronous
+Flask app (parse_macros) and the async server (parse_macros_async).
+"""
+import json
+import math
+import re
+
+# Generation config asking Gemini to answer with JSON only
+JSON_OUTPUT_CONFIG = {'response_mime_type': 'application/json'}
+
+MACRO_FIELDS = ('calories', 'protein', 'carbs', 'fat')
+
+# How many cut points to try when repairing a truncated response
+MAX_REPAIR_CUTS = 200
+
+MACRO_PARSING_PROMPT = """
+        Analyze the following food diary entry and extract detailed nutritional information:
+
+        "{transcribed_text}"
+
+        Please provide a JSON response with the following structure:
+        {{
+            "foods": [
+                {{
+                    "name": "food name",
+                    "quantity": "estimated quantity/serving size",
+                    "calories": estimated_calories_per_serving,
+                    "protein": estimated_protein_grams,
+                    "carbs": estimated_carbs_grams,
+                    "fat": estimated_fat_grams
+                }}
+            ],
+            "analysis": "brief explanation of the nutritional breakdown"
+        }}
+
+        Important notes:
+        - Make reasonable estimates for quantities if not specified
+        - Use standard serving sizes and nutritional databases
+        - Be as accurate as possible with macro calculations
+        - If unsure about a food item, make a reasonable estimate
+        - Use plain numbers for calories, protein, carbs and fat
+        - Return only valid JSON, no additional text
+        """
+
+FOOD_REPAIR_PROMPT = """
+        These food items from the diary entry "{transcribed_text}" are missing
+        valid nutrition values:
+
+        {items}
+
+        Return a JSON array with one object per item, in the same order, each with
+        "name", "quantity", and plain numbers for "calories", "protein", "carbs" and "fat".
+        Return only valid JSON, no additional text.
+        """
+
+MISSING_FOODS_PROMPT = """
+        From the food diary entry "{transcribed_text}", these foods have already been
+        analyzed: {parsed}
+
+        Return a JSON array with one object for every other food eaten, each with
+        "name", "quantity", and plain numbers for "calories", "protein", "carbs" and "fat".
+        Return an empty array if there are none. Return only valid JSON, no additional text.
+        """
+
+# A whole value is a number or a range, optionally approximate and with a unit
+_UNIT = r'\s*(?:kcal|cal|g)?'
+_NUMBER_PATTERN = re.compile(r'~?\s*(\d[\d,]*(?:\.\d+)?)' + _UNIT, re.IGNORECASE)
+_RANGE_PATTERN = re.compile(
+    r'~?\s*(\d[\d,]*(?:\.\d+)?)\s*(?:-|–|to)\s*(\d[\d,]*(?:\.\d+)?)' + _UNIT, re.IGNORECASE)
+
+
+class MacroParseError(ValueError):
+    """Raised when no usable macro data could be recovered"""
+
+
+def coerce_number(value):
+    """Return ``value`` as a non-negative float, or None if it is not one.
+
+    Accepts numbers and strings that are entirely a number or range with
+    an optional unit, such as "120", "1,200 kcal", "~12g" or "10-15" (the
+    midpoint of a range). Anything else, like "2 eggs 140", is rejected
+    so the item goes back to the model instead of being misread.
+    """
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        text = value.strip()
+        match = _RANGE_PATTERN.fullmatch(text)
+        if match:
+            low, high = (float(group.replace(',', '')) for group in match.groups())
+            number = (low + high) / 2
+        else:
+            match = _NUMBER_PATTERN.fullmatch(text)
+            if not match:
+                return None
+            number = float(match.group(1).replace(',', ''))
+    else:
+        return None
+    if not math.isfinite(number) or number < 0:
+        return None
+    return number
+
+def _closing_suffix(stack):
+    return ''.join('}' if opener == '{' else ']' for opener, _ in reversed(stack))
+
+def repair_truncated_json(text):
+    """Parse JSON that was cut off, dropping the incomplete tail.
+
+    Cuts the text at the last point where a value ended, closes the
+    containers still open there and returns the first such candidate
+    that parses, working backwards. A partial value is never kept, so a
+    number cut off mid-digit cannot pass as a smaller one.
+
+    Returns (value, open_keys), where ``open_keys`` lists the containers
+    that were still open at the cut, outermost first, by the key each one
+    sits under (None for the root and for array elements). Raises
+    MacroParseError if no candidate parses.
+    """
+    stack = []
+    in_string = escaped = False
+    string_start = last_string = key = None
+    cuts = []
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+                last_string = text[string_start + 1:i]
+                cuts.append((i + 1, tuple(stack)))
+            continue
+        if char == '"':
+            in_string = True
+            string_start = i
+        elif char == ':':
+            key = last_string
+        elif char in '{[':
+            stack.append((char, key))
+            key = None
+        elif char in '}]':
+            if stack:
+                stack.pop()
+            key = None
+            cuts.append((i + 1, tuple(stack)))
+        elif char == ',':
+            key = None
+            cuts.append((i, tuple(stack)))
+
+    for cut, cut_stack in reversed(cuts[-MAX_REPAIR_CUTS:]):
+        candidate = text[:cut].rstrip().rstrip(',') + _closing_suffix(cut_stack)
+        try:
+            return json.loads(candidate), tuple(key for _, key in cut_stack)
+        except json.JSONDecodeError:
+            continue
+    raise MacroParseError('Could not repair JSON from response')
+
+def extract_json(text):
+    """Return (value, open_keys) for the first JSON object or array in ``text``.
+
+    Surrounding prose and code fences are ignored. ``open_keys`` is None if
+    the JSON was complete, otherwise the containers open where it had to
+    be cut, as returned by repair_truncated_json.
+    """
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        raise MacroParseError('No JSON found in response')
+    start = min(starts)
+    try:
+        value, _ = json.JSONDecoder().raw_decode(text, start)
+        return value, None
+    except json.JSONDecodeError:
+        return repair_truncated_json(text[start:])
+
+def foods_cut_off(value, open_keys):
+    """Whether food items may have been lost where a response was cut.
+
+    True if the cut fell inside the foods array, or before it began. A
+    cut in the trailing analysis loses no foods.
+    """
+    if open_keys is None:
+        return False
+    if not isinstance(value, dict):
+        # A bare array is the food list itself
+        return True
+    return 'foods' in open_keys or 'foods' not in value
+
+def validate_food(item):
+    """Return a normalized food dict, or None if ``item`` lacks a name or any macro value"""
+    if not isinstance(item, dict):
+        return None
+    name = item.get('name')
+    if not isinstance(name, str) or not name.strip():
+        return None
+    food = {'name': name.strip(), 'quantity': str(item.get('quantity') or '').strip()}
+    for field in MACRO_FIELDS:
+        value = coerce_number(item.get(field))
+        if value is None:
+            return None
+        food[field] = value
+    return food
+
+def collect_foods(value):
+    """Split the food items in a parsed response into (valid foods, failed items)"""
+    if isinstance(value, dict):
+        value = value.get('foods', [])
+    if not isinstance(value, list):
+        return [], []
+    foods, failed = [], []
+    for item in value:
+        food = validate_food(item)
+        if food:
+            foods.append(food)
+        else:
+            failed.append(item)
+    return foods, failed
+
+def build_macro_data(foods, analysis):
+    """Assemble the macro data dict, with totals summed from the food items"""
+    data = {'foods': foods}
+    for field in MACRO_FIELDS:
+        data[f'total_{field}'] = round(sum(food[field] for food in foods), 1)
+    data['analysis'] = analysis if isinstance(analysis, str) else ''
+    return data
+
+def _parse_fragment(text):
+    try:
+        return collect_foods(extract_json(text)[0])
+    except MacroParseError:
+        return [], []
+
+def parse_macros_steps(transcribed_text):
+    """Generator yielding prompts and receiving response texts; returns the macro data.
+
+    Errors from the model are thrown into the generator at the yield that
+    asked for the response.
+    """
+    text = yield MACRO_PARSING_PROMPT.format(transcribed_text=transcribed_text)
+    try:
+        parsed, open_keys = extract_json(text)
+        truncated = foods_cut_off(parsed, open_keys)
+    except MacroParseError:
+        # Nothing salvageable: ask for the food list alone
+        parsed, truncated = {}, True
+    foods, failed = collect_foods(parsed)
+    analysis = parsed.get('analysis') if isinstance(parsed, dict) else None
+
+    if truncated:
+        # Covers the dropped tail, including any item cut off part way
+        follow_up = MISSING_FOODS_PROMPT.format(transcribed_text=transcribed_text,
+                                                parsed=json.dumps([food['name'] for food in foods]))
+    elif failed:
+        follow_up = FOOD_REPAIR_PROMPT.format(transcribed_text=transcribed_text,
+                                              items=json.dumps(failed, default=str))
+    else:
+        follow_up = None
+
+    if follow_up:
+        try:
+            text = yield follow_up
+        except Exception:
+            # The follow-up is best effort; keep the foods that already validated
+            if not foods:
+                raise
+            text = ''
+        more, _ = _parse_fragment(text)
+        # The model may list foods it was told were already analyzed
+        seen = {food['name'].casefold() for food in foods}
+        for food in more:
+            if food['name'].casefold() not in seen:
+                seen.add(food['name'].casefold())
+                foods.append(food)
+
+    if not foods and (failed or truncated):
+        raise MacroParseError('Could not extract valid food data from response')
+    return build_macro_data(foods, analysis)
+
+def parse_macros(transcribed_text, generate):
+    """Parse macros using ``generate(prompt) -> response text``"""
+    steps = parse_macros_steps(transcribed_text)
+    prompt = next(steps)
+    while True:
+        try:
+            advance, value = steps.send, generate(prompt)
+        except Exception as error:
+            advance, value = steps.throw, error
+        try:
+            prompt = advance(value)
+        except StopIteration as done:
+            return done.value
+
+async def parse_macros_async(transcribed_text, generate):
+    """Parse macros using ``await generate(prompt) -> response text``"""
+    steps = parse_macros_steps(transcribed_text)
+    prompt = next(steps)
+    while True:
+        try:
+            advance, value = steps.send, await generate(prompt)
+        except Exception as error:
+            advance, value = steps.throw, error
+        try:
+            prompt = advance(value)
+        except StopIteration as done:
+            return done.value
+
+def failure_result(error):
+    """Macro data returned when the food diary could not be analyzed"""
+    return {
+        "error": f"Error parsing food data: {str(error)}",
+        "foods": [],
+        "total_calories": 0,
+        "total_protein": 0,
+        "total_carbs": 0,
+        "total_fat": 0,
+        "analysis": "Failed to analyze food data"
+    }
@@ -0,0 +1,157 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# User ids double as shard file names, so only allow a safe subset
+USER_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class InvalidUserId(ValueError):
+    """Raised when a user id cannot be mapped to a shard file"""
+
+
+class _Shard:
+    """An open shard connection guarded by its own lock"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+        self.closed = False
+
+
+class ShardPool:
+    """Per-user SQLite shards behind a bounded LRU cache of open connections.
+
+    Every user gets their own database file in ``data_dir``, created lazily
+    and initialized with ``initializer(conn)`` the first time it is opened.
+    At most ``capacity`` connections stay open; the least recently used one
+    is closed when a new shard has to be opened.
+    """
+
+    def __init__(self, data_dir, capacity=64, initializer=None):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1')
+        self.data_dir = data_dir
+        self.capacity = capacity
+        self.initializer = initializer
+        self._shards = OrderedDict()
+        self._versions = {}
+        # user id -> Event set once a shard being opened is cached
+        self._opening = {}
+        self._lock = threading.Lock()
+        os.makedirs(data_dir, exist_ok=True)
+
+    def shard_path(self, user_id):
+        """Return the database file backing ``user_id``"""
+        if not isinstance(user_id, str) or not USER_ID_PATTERN.match(user_id):
+            raise InvalidUserId(f"Invalid user id: {user_id!r}")
+        return os.path.join(self.data_dir, f"{user_id}.db")
+
+    def _open(self, user_id):
+        conn = sqlite3.connect(self.shard_path(user_id), check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        if self.initializer:
+            self.initializer(conn)
+        return conn
+
+    def _checkout(self, user_id):
+        while True:
+            with self._lock:
+                shard = self._shards.get(user_id)
+                if shard is not None:
+                    self._shards.move_to_end(user_id)
+                    return shard
+                opening = self._opening.get(user_id)
+                if opening is None:
+                    opening = self._opening[user_id] = threading.Event()
+                    break
+            # Another thread is opening this shard; wait for it, then look again
+            opening.wait()
+
+        # Opening runs the initializer, which can migrate and vacuum a legacy
+        # database, so it happens outside the cache lock and only blocks
+        # requests for this user
+        try:
+            conn = self._open(user_id)
+        except BaseException:
+            with self._lock:
+                del self._opening[user_id]
+            opening.set()
+            raise
+
+        evicted = []
+        with self._lock:
+            shard = _Shard(conn)
+            self._shards[user_id] = shard
+            del self._opening[user_id]
+            while len(self._shards) > self.capacity:
+                evicted.append(self._shards.popitem(last=False)[1])
+        opening.set()
+
+        # Evicted shards are closed on their own threads: waiting for their
+        # locks here would hold this request behind the evicted tenant's work
+        for old in evicted:
+            threading.Thread(target=self._close, args=(old,), daemon=True).start()
+        return shard
+
+    @staticmethod
+    def _close(shard):
+        with shard.lock:
+            shard.closed = True
+            shard.conn.close()
+
+    @contextmanager
+    def connection(self, user_id):
+        """Yield the connection for ``user_id`` inside a transaction.
+
+        Commits when the block exits normally and rolls back on error.
+        Access to a single shard is serialized; different shards proceed
+        in parallel. Any block that changes rows bumps the shard's version.
+        """
+        while True:
+            shard = self._checkout(user_id)
+            with shard.lock:
+                # Evicted between checkout and lock; reopen and retry
+                if shard.closed:
+                    continue
+                changes = shard.conn.total_changes
+                try:
+                    yield shard.conn
+                    shard.conn.commit()
+                except BaseException:
+                    shard.conn.rollback()
+                    raise
+                finally:
+                    if shard.conn.total_changes != changes:
+                        self._bump_version(user_id)
+                return
+
+    def _bump_version(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def version(self, user_id):
+        """Return a counter that changes whenever ``user_id``'s shard is written to
+
+        Only writes made through this pool are seen, so caches keyed on
+        the version should still expire on their own.
+        """
+        with self._lock:
+            return self._versions.get(user_id, 0)
+
+    def open_shards(self):
+        """Return the user ids whose shards are currently open"""
+        with self._lock:
+            return list(self._shards)
+
+    def close_all(self):
+        """Close every cached connection"""
+        with self._lock:
+            shards = list(self._shards.values())
+            self._shards.clear()
+        for shard in shards:
+            self._close(shard)
@@ -0,0 +1,346 @@
+"""Bulk synthetic data for scale testing.
+
+Generates realistic medical records, prescriptions and macro entries spread
+across a date range, with daily_macro_stats accumulated from the generated
+entries. Output is fully determined by the seed, except for rows on the
+current UTC day, whose times stop at the moment of generation.
+
+    python synthetic_data.py --records 100000 --prescriptions 50000 \\
+        --macro-entries 1000000 --start 2023-01-01 --end 2024-12-31 \\
+        --users 10 --seed 7
+"""
+import argparse
+import json
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from cold_storage import compress_text, preview_text
+
+DEFAULT_BATCH_SIZE = 20000
+
+# Stored in the source (user_input for macro entries) column of every generated row
+SYNTHETIC_SOURCE = 'synthetic_data'
+# Users the API may generate data for; the CLI names its users the same way
+SYNTHETIC_USER_PREFIX = 'synthetic-'
+
+PATIENT_FIRST_NAMES = ['John', 'Sarah', 'Michael', 'Priya', 'Wei', 'Amara', 'Carlos', 'Fatima',
+                       'Olga', 'Kenji', 'Aisha', 'David', 'Elena', 'Rahul', 'Grace', 'Tomás']
+PATIENT_LAST_NAMES = ['Smith', 'Johnson', 'Brown', 'Patel', 'Chen', 'Okafor', 'Garcia', 'Khan',
+                      'Ivanova', 'Tanaka', 'Mensah', 'Miller', 'Rossi', 'Sharma', 'Lee', 'Silva']
+DOCTORS = [
+    ('Dr. Emily Wilson', 'Internal Medicine Clinic'),
+    ('Dr. Robert Chen', 'Endocrinology Associates'),
+    ('Dr. Anjali Rao', 'City Heart Institute'),
+    ('Dr. Marcus Green', 'Riverside Family Practice'),
+    ('Dr. Laura Novak', 'Pulmonary Care Center'),
+    ('Dr. Samuel Adeyemi', 'General Hospital Emergency Department'),
+]
+
+# (diagnosis, visit type, medicines commonly prescribed for it)
+CONDITIONS = [
+    ('Essential hypertension', 'Follow-up visit', ['Lisinopril 10mg', 'Amlodipine 5mg', 'Hydrochlorothiazide 25mg']),
+    ('Type 2 Diabetes Mellitus', 'Diabetes follow-up', ['Metformin ER 500mg', 'Glipizide 5mg', 'Lantus Insulin 10 units']),
+    ('Hyperlipidemia', 'Annual physical examination', ['Atorvastatin 20mg', 'Rosuvastatin 10mg', 'Aspirin 81mg']),
+    ('Mild persistent asthma', 'Pulmonology consultation', ['Fluticasone inhaler 110mcg', 'Albuterol inhaler 90mcg', 'Montelukast 10mg']),
+    ('Hypothyroidism', 'Endocrinology follow-up', ['Levothyroxine 50mcg', 'Levothyroxine 75mcg']),
+    ('Anxiety-related chest pain', 'Emergency Department Visit', ['Lorazepam 1mg', 'Sertraline 50mg']),
+    ('Gastroesophageal reflux disease', 'Gastroenterology consultation', ['Omeprazole 20mg', 'Famotidine 20mg']),
+    ('Seasonal allergic rhinitis', 'Primary care visit', ['Cetirizine 10mg', 'Fluticasone nasal spray']),
+    ('Community-acquired pneumonia', 'Urgent care visit', ['Amoxicillin 500mg', 'Azithromycin 250mg', 'Paracetamol 500mg']),
+    ('Iron deficiency anemia', 'Hematology follow-up', ['Ferrous sulfate 325mg', 'Vitamin C 500mg']),
+]
+
+MEDICINE_PURPOSES = {
+    'Lisinopril 10mg': 'ACE inhibitor that relaxes blood vessels to lower blood pressure',
+    'Amlodipine 5mg': 'Calcium channel blocker that widens arteries to reduce blood pressure',
+    'Hydrochlorothiazide 25mg': 'Diuretic that removes excess salt and water to lower blood pressure',
+    'Metformin ER 500mg': 'Reduces glucose production by the liver and improves insulin sensitivity',
+    'Glipizide 5mg': 'Sulfonylurea that stimulates the pancreas to release insulin',
+    'Lantus Insulin 10 units': 'Long-acting basal insulin providing steady glucose control over 24 hours',
+    'Atorvastatin 20mg': 'Statin that lowers LDL cholesterol and cardiovascular risk',
+    'Rosuvastatin 10mg': 'High-potency statin that lowers LDL cholesterol',
+    'Aspirin 81mg': 'Low-dose antiplatelet therapy that helps prevent blood clots',
+    'Fluticasone inhaler 110mcg': 'Inhaled corticosteroid that reduces airway inflammation',
+    'Albuterol inhaler 90mcg': 'Rescue bronchodilator that quickly opens the airways',
+    'Montelukast 10mg': 'Leukotriene blocker that prevents asthma and allergy symptoms',
+    'Levothyroxine 50mcg': 'Synthetic thyroid hormone replacing what the thyroid no longer makes',
+    'Levothyroxine 75mcg': 'Synthetic thyroid hormone replacing what the thyroid no longer makes',
+    'Lorazepam 1mg': 'Short-acting benzodiazepine that relieves acute anxiety',
+    'Sertraline 50mg': 'SSRI antidepressant used for long-term anxiety management',
+    'Omeprazole 20mg': 'Proton pump inhibitor that reduces stomach acid production',
+    'Famotidine 20mg': 'H2 blocker that reduces stomach acid',
+    'Cetirizine 10mg': 'Antihistamine that relieves sneezing, itching and runny nose',
+    'Fluticasone nasal spray': 'Nasal corticosteroid that reduces nasal inflammation',
+    'Amoxicillin 500mg': 'Penicillin antibiotic that treats bacterial infections',
+    'Azithromycin 250mg': 'Macrolide antibiotic covering atypical respiratory bacteria',
+    'Paracetamol 500mg': 'Relieves fever and mild to moderate pain',
+    'Ferrous sulfate 325mg': 'Iron supplement that rebuilds iron stores and hemoglobin',
+    'Vitamin C 500mg': 'Improves absorption of iron supplements',
+}
+
+DOSING = ['Take once daily in the morning', 'Take once daily at bedtime', 'Take twice daily with meals',
+          'Take three times daily', 'Take once daily with food', 'Use as needed, up to 4 times daily']
+SUPPLY = ['7 day supply', '14 day supply', '30 day supply', '90 day supply']
+
+# (name, serving, calories, protein, carbs, fat) per serving
+FOODS = [
+    ('Scrambled eggs', '2 large eggs', 140, 12, 1, 10),
+    ('Whole wheat toast', '2 slices', 160, 6, 30, 2),
+    ('Avocado', '1/2 medium', 160, 2, 9, 15),
+    ('Oatmeal', '1 cup cooked', 150, 5, 27, 3),
+    ('Greek yogurt', '1 cup', 130, 23, 9, 0),
+    ('Banana', '1 medium', 105, 1, 27, 0),
+    ('Poha', '1 plate', 250, 5, 45, 6),
+    ('Idli with sambar', '3 idlis', 270, 9, 50, 4),
+    ('Grilled chicken breast', '4 oz', 185, 35, 0, 4),
+    ('Mixed green salad', '2 cups', 20, 2, 4, 0),
+    ('Olive oil dressing', '2 tbsp', 120, 0, 0, 14),
+    ('Roti', '2 rotis', 240, 8, 44, 4),
+    ('Dal', '1 cup', 230, 18, 40, 1),
+    ('Steamed rice', '1 cup', 205, 4, 45, 0),
+    ('Paneer tikka', '6 pieces', 320, 20, 8, 23),
+    ('Baked salmon', '5 oz', 280, 40, 0, 12),
+    ('Quinoa', '1 cup cooked', 220, 8, 39, 4),
+    ('Steamed broccoli', '1 cup', 25, 3, 5, 0),
+    ('Pasta with tomato sauce', '1.5 cups', 330, 11, 62, 5),
+    ('Almonds', '1 oz', 165, 6, 6, 14),
+    ('Apple', '1 medium', 95, 0, 25, 0),
+    ('Cheeseburger', '1 burger', 540, 30, 40, 29),
+]
+MEALS = ['breakfast', 'lunch', 'dinner', 'a snack']
+
+def _random_timestamp(rng, start, days, latest=None):
+    """A UTC timestamp on a random day in [start, start + days) in created_at format.
+
+    Timestamps never fall after ``latest`` (a naive UTC datetime), so rows
+    generated for today do not sort above uploads made later today.
+    """
+    day = start + timedelta(days=rng.randrange(days))
+    midnight = datetime(day.year, day.month, day.day)
+    seconds = 86400
+    if latest is not None and day == latest.date():
+        seconds = max(1, int((latest - midnight).total_seconds()))
+    moment = midnight + timedelta(seconds=rng.randrange(seconds))
+    return day, moment.strftime('%Y-%m-%d %H:%M:%S')
+
+def _utc_now():
+    """The current time as a naive UTC datetime, like SQLite's CURRENT_TIMESTAMP"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def _patient(rng):
+    return f"{rng.choice(PATIENT_FIRST_NAMES)} {rng.choice(PATIENT_LAST_NAMES)}"
+
+def make_medical_record(rng, start, days, latest=None):
+    """Return (filename, original_text, summary, created_at)"""
+    diagnosis, visit_type, medicines = rng.choice(CONDITIONS)
+    doctor, clinic = rng.choice(DOCTORS)
+    day, created_at = _random_timestamp(rng, start, days, latest)
+    patient = _patient(rng)
+    medicine = rng.choice(medicines)
+    systolic, diastolic = rng.randint(100, 165), rng.randint(60, 100)
+    original_text = '\n'.join([
+        visit_type,
+        f"Patient: {patient}",
+        f"Date of Visit: {day.isoformat()}",
+        f"Doctor: {doctor}, {clinic}",
+        f"Chief Complaint: {diagnosis} - {rng.choice(['routine review', 'worsening symptoms', 'medication refill', 'new symptoms'])}",
+        f"Vital Signs: BP {systolic}/{diastolic}, HR {rng.randint(55, 110)}, Temp {rng.uniform(97.0, 100.4):.1f}°F, "
+        f"Weight {rng.randint(110, 240)} lbs",
+        f"Diagnosis: {diagnosis}",
+        f"Current Medications: {medicine}",
+        f"Assessment: {rng.choice(['Stable', 'Improving', 'Not at target', 'Well controlled'])}.",
+        f"Plan: Continue {medicine}, follow up in {rng.choice([2, 4, 6, 12])} weeks.",
+    ])
+    summary = f"{visit_type} for {diagnosis.lower()}. Managed with {medicine}; BP {systolic}/{diastolic}."
+    return (f"{visit_type.lower().replace(' ', '_')}_{day.isoformat()}.jpg", original_text, summary, created_at)
+
+def make_prescription(rng, start, days, latest=None):
+    """Return (filename, medicines, analysis, created_at)"""
+    diagnosis, _, candidates = rng.choice(CONDITIONS)
+    doctor, clinic = rng.choice(DOCTORS)
+    day, created_at = _random_timestamp(rng, start, days, latest)
+    chosen = rng.sample(candidates, rng.randint(1, len(candidates)))
+    medicine_lines = [f"{i}. {name} - {rng.choice(DOSING)} - {rng.choice(SUPPLY)}"
+                      for i, name in enumerate(chosen, 1)]
+    medicines = '\n'.join([
+        f"Doctor: {doctor}, {clinic}",
+        f"Patient: {_patient(rng)}",
+        f"Date: {day.isoformat()}",
+        '',
+        'Medications Prescribed:',
+        *medicine_lines,
+    ])
+    analysis = '\n\n'.join(
+        f"{i}. {name}: {MEDICINE_PURPOSES[name]}. Prescribed for {diagnosis.lower()}. "
+        f"Take consistently and do not stop without consulting your doctor."
+        for i, name in enumerate(chosen, 1)
+    )
+    return (f"prescription_{day.isoformat()}.jpg", medicines, analysis, created_at)
+
+def make_macro_entry(rng, start, days, latest=None):
+    """Return (transcribed_text, foods, totals, entry_date, created_at) with totals summed from foods"""
+    day, created_at = _random_timestamp(rng, start, days, latest)
+    foods = []
+    for name, serving, calories, protein, carbs, fat in rng.sample(FOODS, rng.randint(1, 4)):
+        servings = rng.choice([0.5, 1, 1, 1, 1.5, 2])
+        foods.append({
+            'name': name,
+            'quantity': serving if servings == 1 else f"{servings} x {serving}",
+            'calories': round(calories * servings, 1),
+            'protein': round(protein * servings, 1),
+            'carbs': round(carbs * servings, 1),
+            'fat': round(fat * servings, 1),
+        })
+    totals = tuple(round(sum(food[key] for food in foods), 1)
+                   for key in ('calories', 'protein', 'carbs', 'fat'))
+    transcribed_text = f"For {rng.choice(MEALS)} I had " + ', '.join(food['name'].lower() for food in foods)
+    return transcribed_text, foods, totals, day.isoformat(), created_at
+
+def add_daily_macro_totals(cursor, totals_by_date):
+    """Add per-day totals onto daily_macro_stats.
+
+    ``totals_by_date`` maps entry_date -> [calories, protein, carbs, fat,
+    meal_count]. Existing rows are incremented rather than replaced, so
+    real entries logged on the same day are preserved.
+    """
+    cursor.executemany('''
+        INSERT INTO daily_macro_stats
+        (entry_date, total_calories, total_protein, total_carbs, total_fat, meal_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(entry_date) DO UPDATE SET
+            total_calories = total_calories + excluded.total_calories,
+            total_protein = total_protein + excluded.total_protein,
+            total_carbs = total_carbs + excluded.total_carbs,
+            total_fat = total_fat + excluded.total_fat,
+            meal_count = meal_count + excluded.meal_count,
+            updated_at = CURRENT_TIMESTAMP
+    ''', [(entry_date, *totals) for entry_date, totals in totals_by_date.items()])
+
+def _next_id(cursor, table):
+    # Never reuse ids of deleted rows, matching AUTOINCREMENT
+    cursor.execute(f'''
+        SELECT MAX(COALESCE(MAX(id), 0),
+                   COALESCE((SELECT seq FROM sqlite_sequence WHERE name = ?), 0)) + 1
+        FROM {table}
+    ''', (table,))
+    return cursor.fetchone()[0]
+
+def _batches(total, batch_size):
+    while total > 0:
+        size = min(total, batch_size)
+        yield size
+        total -= size
+
+def generate(conn, records=0, prescriptions=0, macro_entries=0, start=None, end=None,
+             seed=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Insert synthetic rows into one user's shard.
+
+    Rows are written with executemany in batches of ``batch_size``, one
+    transaction per batch. Ids are assigned up front so the compressed
+    cold text can be batched alongside its owner rows. Returns the
+    number of rows created per table.
+    """
+    latest = _utc_now()
+    end = end or latest.date() - timedelta(days=1)
+    start = start or end - timedelta(days=364)
+    if start > end:
+        raise ValueError('start date must not be after end date')
+    if end > latest.date():
+        raise ValueError('end date must not be in the future')
+    if batch_size < 1:
+        raise ValueError('batch size must be at least 1')
+    days = (end - start).days + 1
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+
+    for size in _batches(records, batch_size):
+        first_id = _next_id(cursor, 'medical_records')
+        rows = [make_medical_record(rng, start, days, latest) for _ in range(size)]
+        cursor.executemany('''
+            INSERT INTO medical_records (id, filename, summary, source, created_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', [(first_id + i, row[0], row[2], SYNTHETIC_SOURCE, row[3]) for i, row in enumerate(rows)])
+        cursor.executemany('''
+            INSERT INTO medical_record_texts (record_id, original_text)
+            VALUES (?, ?)
+        ''', [(first_id + i, compress_text(row[1])) for i, row in enumerate(rows)])
+        conn.commit()
+
+    for size in _batches(prescriptions, batch_size):
+        first_id = _next_id(cursor, 'prescriptions')
+        rows = [make_prescription(rng, start, days, latest) for _ in range(size)]
+        cursor.executemany('''
+            INSERT INTO prescriptions (id, filename, medicines_preview, medicines, source, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(first_id + i, row[0], preview_text(row[1]), row[1], SYNTHETIC_SOURCE, row[3])
+              for i, row in enumerate(rows)])
+        cursor.executemany('''
+            INSERT INTO prescription_analyses (prescription_id, analysis)
+            VALUES (?, ?)
+        ''', [(first_id + i, compress_text(row[2])) for i, row in enumerate(rows)])
+        conn.commit()
+
+    for size in _batches(macro_entries, batch_size):
+        rows = []
+        totals_by_date = {}
+        for _ in range(size):
+            transcribed_text, foods, totals, entry_date, created_at = make_macro_entry(rng, start, days, latest)
+            rows.append((SYNTHETIC_SOURCE, transcribed_text, json.dumps(foods), *totals, entry_date, created_at))
+            day_totals = totals_by_date.setdefault(entry_date, [0, 0, 0, 0, 0])
+            for i, value in enumerate(totals):
+                day_totals[i] += value
+            day_totals[4] += 1
+        cursor.executemany('''
+            INSERT INTO macro_entries
+            (user_input, transcribed_text, parsed_foods, total_calories,
+             total_protein, total_carbs, total_fat, entry_date, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        add_daily_macro_totals(cursor, totals_by_date)
+        conn.commit()
+
+    return {
+        'medical_records': records,
+        'prescriptions': prescriptions,
+        'macro_entries': macro_entries,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--records', type=int, default=1000, help='medical records per user')
+    parser.add_argument('--prescriptions', type=int, default=1000, help='prescriptions per user')
+    parser.add_argument('--macro-entries', type=int, default=5000, help='macro entries per user')
+    parser.add_argument('--start', type=date.fromisoformat, help='first date (default: a year before --end)')
+    parser.add_argument('--end', type=date.fromisoformat, help='last date, in UTC (default: yesterday)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    users = parser.add_mutually_exclusive_group()
+    users.add_argument('--user', action='append', dest='user_ids',
+                       help=f'user id to populate (repeatable; default: {SYNTHETIC_USER_PREFIX}0)')
+    users.add_argument('--users', type=int,
+                       help=f'populate this many users named {SYNTHETIC_USER_PREFIX}0, {SYNTHETIC_USER_PREFIX}1, ...')
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
+
+    # Imported here so the generator itself can be used without the app
+    from app import shard_pool, update_embedding_index
+
+    if args.users:
+        user_ids = [f"{SYNTHETIC_USER_PREFIX}{i}" for i in range(args.users)]
+    else:
+        user_ids = args.user_ids or [f"{SYNTHETIC_USER_PREFIX}0"]
+
+    for index, user_id in enumerate(user_ids):
+        started = time.perf_counter()
+        with shard_pool.connection(user_id) as conn:
+            # Offset the seed per user so tenants get different data
+            counts = generate(conn, args.records, args.prescriptions, args.macro_entries,
+                              args.start, args.end, args.seed + index, args.batch_size)
+        update_embedding_index(user_id)
+        elapsed = time.perf_counter() - started
+        print(f"{user_id}: {sum(counts.values())} rows in {elapsed:.1f}s ({counts})")
+
+if __name__ == '__main__':
+    main()
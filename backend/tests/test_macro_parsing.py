@@ -0,0 +1,164 @@
+import asyncio
+import json
+
+import pytest
+
+import macro_parsing
+from macro_parsing import MacroParseError, coerce_number, parse_macros, repair_truncated_json
+
+EGG = {"name": "Egg", "quantity": "2", "calories": 140, "protein": 12, "carbs": 1, "fat": 10}
+TOAST = {"name": "Toast", "quantity": "1 slice", "calories": 80, "protein": 3, "carbs": 15, "fat": 1}
+APPLE = {"name": "Apple", "quantity": "1", "calories": 95, "protein": 0.5, "carbs": 25, "fat": 0.3}
+
+
+class FakeModel:
+    """Returns canned responses in order and records the prompts it was sent"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.prompts = []
+
+    def __call__(self, prompt):
+        self.prompts.append(prompt)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def response(foods, **extra):
+    return json.dumps({"foods": foods, **extra})
+
+
+@pytest.mark.parametrize('value, expected', [
+    (140, 140.0),
+    ('120', 120.0),
+    ('1,200 kcal', 1200.0),
+    ('~12g', 12.0),
+    ('12.5 g', 12.5),
+    ('10-15', 12.5),
+    ('10 to 20g', 15.0),
+    ('2 eggs 140', None),
+    ('1.2e3', None),
+    ('1e400', None),
+    ('-5', None),
+    ('unknown', None),
+    (float('inf'), None),
+    (True, None),
+    (None, None),
+])
+def test_coerce_number(value, expected):
+    assert coerce_number(value) == expected
+
+
+def test_repair_drops_partial_values():
+    assert repair_truncated_json('{"foods": [{"name": "Egg", "calories": 14') == \
+        ({"foods": [{"name": "Egg"}]}, (None, 'foods', None))
+    assert repair_truncated_json('{"foods": [{"name": "Egg"}], "analysis": "The meal is hi') == \
+        ({"foods": [{"name": "Egg"}]}, (None,))
+
+
+def test_repair_gives_up_without_a_complete_value():
+    with pytest.raises(MacroParseError):
+        repair_truncated_json('{"fo')
+
+
+def test_totals_are_recomputed_from_foods():
+    model = FakeModel("```json\n" + response(
+        [dict(EGG, calories="140 kcal", protein="12g"), TOAST],
+        total_calories=9999, analysis="ok") + "\n```")
+
+    data = parse_macros("two eggs and toast", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg', 'Toast']
+    assert data['total_calories'] == 220.0
+    assert data['total_protein'] == 15.0
+    assert data['analysis'] == 'ok'
+    assert len(model.prompts) == 1
+
+
+def test_empty_meal_needs_no_follow_up():
+    model = FakeModel(response([], analysis="nothing eaten"))
+
+    data = parse_macros("nothing today", model)
+
+    assert data['foods'] == [] and data['total_calories'] == 0
+    assert len(model.prompts) == 1
+
+
+def test_invalid_items_are_re_asked_alone():
+    model = FakeModel(response([EGG, dict(APPLE, calories="2 apples")]), json.dumps([APPLE]))
+
+    data = parse_macros("two eggs and an apple", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg', 'Apple']
+    assert data['total_calories'] == 235.0
+    repair_prompt = model.prompts[1]
+    assert '"2 apples"' in repair_prompt and '"Egg"' not in repair_prompt
+
+
+def test_truncated_response_asks_only_for_missing_foods():
+    full = response([EGG, TOAST, APPLE])
+    model = FakeModel(full[:full.index('"Toast"') + 20], json.dumps([TOAST, APPLE]))
+
+    data = parse_macros("two eggs, toast and an apple", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg', 'Toast', 'Apple']
+    assert data['total_calories'] == 315.0
+    assert len(model.prompts) == 2
+    assert '["Egg"]' in model.prompts[1]
+
+
+def test_cut_in_analysis_needs_no_follow_up():
+    full = response([EGG, TOAST], analysis="The meal is high in protein")
+    model = FakeModel(full[:full.index('high')])
+
+    data = parse_macros("two eggs and toast", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg', 'Toast']
+    assert data['total_calories'] == 220.0
+    assert len(model.prompts) == 1
+
+
+def test_follow_up_foods_already_parsed_are_dropped():
+    full = response([EGG, TOAST])
+    model = FakeModel(full[:full.index('"Toast"') + 20], json.dumps([dict(EGG, name="egg"), TOAST]))
+
+    data = parse_macros("two eggs and toast", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg', 'Toast']
+    assert data['total_calories'] == 220.0
+
+
+def test_failed_follow_up_keeps_validated_foods():
+    model = FakeModel(response([EGG, {"name": "Apple"}]), RuntimeError("quota exceeded"))
+
+    data = parse_macros("two eggs and an apple", model)
+
+    assert [food['name'] for food in data['foods']] == ['Egg']
+    assert data['total_calories'] == 140.0
+
+
+def test_failed_follow_up_without_foods_raises():
+    model = FakeModel(response([{"name": "Apple"}]), RuntimeError("quota exceeded"))
+
+    with pytest.raises(RuntimeError):
+        parse_macros("an apple", model)
+
+
+def test_unusable_responses_raise():
+    model = FakeModel("Sorry, I cannot help with that", "still no JSON")
+
+    with pytest.raises(MacroParseError):
+        parse_macros("an apple", model)
+
+
+def test_async_driver_matches_sync():
+    model = FakeModel(response([EGG, {"name": "Toast"}]), json.dumps([TOAST]))
+
+    async def generate(prompt):
+        return model(prompt)
+
+    data = asyncio.run(macro_parsing.parse_macros_async("two eggs and toast", generate))
+
+    assert data['total_calories'] == 220.0
@@ -17,53 +17,52 @@ function App() {
   const [selectedPrescription, setSelectedPrescription] = useState(null)
   const [macroEntries, setMacroEntries] = useState([])
   const [dailyStats, setDailyStats] = useState([])
+  const [pageSize, setPageSize] = useState(20)
+  const [hasMore, setHasMore] = useState({ records: false, prescriptions: false, macroEntries: false })
 
   useEffect(() => {
-    fetchMedicalRecords()
-    fetchPrescriptions()
-    fetchMacroEntries()
-    fetchDailyStats()
+    fetchDashboard()
   }, [])
 
-  const fetchMedicalRecords = async () => {
+  // Loads the first page of every list and recent macro stats in one request
+  const fetchDashboard = async () => {
     try {
-      const response = await fetch(`${API_BASE_URL}/medical-records`)
+      const response = await fetch(`${API_BASE_URL}/dashboard`)
       const data = await response.json()
-      setMedicalRecords(data)
+      setMedicalRecords(data.medical_records)
+      setPrescriptions(data.prescriptions)
+      setMacroEntries(data.macro_entries)
+      setDailyStats(data.daily_stats)
+      setPageSize(data.page_size)
+      setHasMore({
+        records: data.medical_records.length === data.page_size,
+        prescriptions: data.prescriptions.length === data.page_size,
+        macroEntries: data.macro_entries.length === data.page_size
+      })
     } catch (error) {
-      console.error('Error fetching medical records:', error)
+      console.error('Error fetching dashboard:', error)
     }
   }
 
-  const fetchPrescriptions = async () => {
+  // Appends the next page of a list after the rows already shown
+  const loadMore = async (endpoint, items, setItems, key) => {
     try {
-      const response = await fetch(`${API_BASE_URL}/prescriptions`)
-      const data = await response.json()
-      setPrescriptions(data)
-    } catch (error) {
-      console.error('Error fetching prescriptions:', error)
-    }
-  }
-
-  const fetchMacroEntries = async () => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/macro-entries`)
-      const data = await response.json()
-      setMacroEntries(data)
+      const response = await fetch(`${API_BASE_URL}/${endpoint}?limit=${pageSize}&offset=${items.length}`)
+      const page = await response.json()
+      // Rows added since the first page shift offsets, so skip any already shown
+      const shown = new Set(items.map((item) => item.id))
+      setItems([...items, ...page.filter((item) => !shown.has(item.id))])
+      setHasMore((current) => ({ ...current, [key]: page.length === pageSize }))
     } catch (error) {
-      console.error('Error fetching macro entries:', error)
+      console.error(`Error loading more ${endpoint}:`, error)
     }
   }
 
-  const fetchDailyStats = async () => {
-    try {
-      const response = await fetch(`${API_BASE_URL}/daily-macro-stats`)
-      const data = await response.json()
-      setDailyStats(data)
-    } catch (error) {
-      console.error('Error fetching daily stats:', error)
-    }
-  }
+  const LoadMoreButton = ({ onClick }) => (
+    <Button variant="outline" onClick={onClick} className="w-full">
+      Load more
+    </Button>
+  )
 
   const handleFileUpload = async (file, type) => {
     if (!file) return
@@ -94,10 +93,7 @@ function App() {
         console.log('Response data:', data)
         
         if (response.ok) {
-          await fetchMedicalRecords()
-          await fetchPrescriptions()
-          await fetchMacroEntries()
-          await fetchDailyStats()
+          await fetchDashboard()
           alert('PDF uploaded and processed as medical record with sample data!')
         } else {
           alert(`Error: ${data.error}`)
@@ -132,11 +128,7 @@ function App() {
         const data = await response.json()
         
         if (response.ok) {
-          if (type === 'medical-record') {
-            fetchMedicalRecords()
-          } else {
-            fetchPrescriptions()
-          }
+          fetchDashboard()
           alert(data.message)
         } else {
           alert(`Error: ${data.error}`)
@@ -299,6 +291,9 @@ function App() {
                   </div>
                 </div>
               ))}
+              {hasMore.macroEntries && (
+                <LoadMoreButton onClick={() => loadMore('macro-entries', macroEntries, setMacroEntries, 'macroEntries')} />
+              )}
             </div>
           ) : (
             <div className="text-center py-8">
@@ -385,6 +380,9 @@ function App() {
                   </CardContent>
                 </Card>
               ))}
+              {hasMore.records && (
+                <LoadMoreButton onClick={() => loadMore('medical-records', medicalRecords, setMedicalRecords, 'records')} />
+              )}
               {medicalRecords.length === 0 && (
                 <Card>
                   <CardContent className="text-center py-8">
@@ -435,6 +433,9 @@ function App() {
                   </CardContent>
                 </Card>
               ))}
+              {hasMore.prescriptions && (
+                <LoadMoreButton onClick={() => loadMore('prescriptions', prescriptions, setPrescriptions, 'prescriptions')} />
+              )}
               {prescriptions.length === 0 && (
                 <Card>
                   <CardContent className="text-center py-8">
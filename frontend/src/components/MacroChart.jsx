@@ -19,18 +19,12 @@ const MacroChart = () => {
     try {
       setLoading(true);
       
-      // Fetch daily stats
-      const dailyResponse = await fetch('http://localhost:5000/api/daily-macro-stats?days=14');
-      if (dailyResponse.ok) {
-        const dailyData = await dailyResponse.json();
-        setDailyStats(dailyData.reverse()); // Reverse to show chronologically
-      }
-
-      // Fetch macro entries
-      const entriesResponse = await fetch('http://localhost:5000/api/macro-entries');
-      if (entriesResponse.ok) {
-        const entriesData = await entriesResponse.json();
-        setMacroEntries(entriesData);
+      // Daily stats for the last 14 days and recent entries in one request
+      const response = await fetch('/api/dashboard');
+      if (response.ok) {
+        const data = await response.json();
+        setDailyStats(data.daily_stats.reverse()); // Reverse to show chronologically
+        setMacroEntries(data.macro_entries);
       }
 
     } catch (err) {